@@ -1,13 +1,29 @@
 import os
 import threading
 import random
-from flask import Flask, request, jsonify, send_from_directory
+import json
+import queue
+import urllib.request
+from flask import Flask, request, jsonify, send_file
+from werkzeug.utils import safe_join, secure_filename
 from flask_cors import CORS
 import fiftyone as fo
-from fiftyone import Sample, Classification
+from fiftyone import Sample, Classification, ViewField as F
 from PIL import Image
 from dotenv import load_dotenv
 
+from sample_index import SampleIndex
+from storage_stats import StorageStats
+from metering import MetricsStore, RequestMeter
+from listing_cache import DirectoryListing, listing_response
+from thumbnails import ThumbnailCache, THUMB_SIZES, pick_format
+from image_serving import send_cached_file
+from ingest_jobs import JobQueue
+from batch_upload import ARCHIVE_ERRORS, archive_kind, is_image, iter_upload
+from upload_store import UploadStore
+from startup import StartupTask
+from dataset_watcher import DatasetWatcher
+
 # ----------------------------
 # Load MongoDB credentials
 # ----------------------------
@@ -17,52 +33,124 @@ db_password = os.getenv("MONGODB_PASSWORD")
 # ----------------------------
 # CONFIG
 # ----------------------------
-UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+UPLOAD_FOLDER = "uploads"  # content-addressed: uploads/objects/ab/cd/<sha256>.<ext>
+UPLOAD_STORE_DB = os.getenv("UPLOAD_STORE_DB", "uploads.db")  # filename -> sha256 mapping
 
 DATASET_NAME = "MyDataset"
 
+STATS_FILE = "stats.json"
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", "0"))  # seconds, 0 = off
+
+DATASET_MAX_AGE = int(os.getenv("DATASET_MAX_AGE", "3600"))  # seconds, for unversioned URLs
+DATASET_X_ACCEL_PREFIX = os.getenv("DATASET_X_ACCEL_PREFIX")  # e.g. "/protected/dataset/" behind nginx
+
+THUMB_CACHE_DIR = os.getenv("THUMB_CACHE_DIR", "thumb_cache")
+THUMB_CACHE_MAX_MB = int(os.getenv("THUMB_CACHE_MAX_MB", "512"))
+
+METRICS_DB = os.getenv("METRICS_DB", "metrics.db")
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", "30"))  # seconds
+METRICS_TRUSTED_PROXIES = int(os.getenv("METRICS_TRUSTED_PROXIES", "1"))  # nginx in front; 0 = use the socket peer
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "256"))  # beyond this /upload answers 503
+INGEST_INFERENCE_URL = os.getenv("INGEST_INFERENCE_URL")  # e.g. http://127.0.0.1:5003 (inference_server.py)
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "2000"))  # per /upload_batch request
+
+DATASET_WATCH = os.getenv("DATASET_WATCH", "1") == "1"  # follow dataset/ folder changes without a restart
+DATASET_WATCH_DEBOUNCE = float(os.getenv("DATASET_WATCH_DEBOUNCE", "2"))  # seconds of quiet before syncing
+DATASET_WATCH_POLL = float(os.getenv("DATASET_WATCH_POLL", "5"))  # seconds, only without watchdog installed
+
 # ----------------------------
 # Flask app
 # ----------------------------
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count"])
+
+request_meter = RequestMeter(MetricsStore(METRICS_DB), flush_interval=METRICS_FLUSH_INTERVAL,
+                             trusted_proxies=METRICS_TRUSTED_PROXIES)
+request_meter.init_app(app)
 
 # ----------------------------
-# FiftyOne dataset (persistent)
+# Thumbnails (/thumb serves dataset/ only, so only dataset images are pre-generated)
 # ----------------------------
-if DATASET_NAME in fo.list_datasets():
-    dataset = fo.load_dataset(DATASET_NAME)
-    print(f"📂 Loaded existing dataset: {DATASET_NAME}")
-else:
-    dataset = fo.Dataset(DATASET_NAME)
-    print(f"✨ Created new dataset: {DATASET_NAME}")
+thumbnail_cache = ThumbnailCache(THUMB_CACHE_DIR, max_bytes=THUMB_CACHE_MAX_MB * 1024 * 1024)
+
+def pregenerate_thumbnails(filepaths):
+    if not filepaths:
+        return
+    def run():
+        for filepath in filepaths:
+            try:
+                thumbnail_cache.pregenerate(filepath)
+            except Exception as e:
+                print(f"⚠️ Thumbnail generation failed for {filepath}: {e}")
+    threading.Thread(target=run, daemon=True).start()
+
+# ----------------------------
+# FiftyOne dataset (persistent, loaded in the background so Flask binds at once)
+# ----------------------------
+dataset = None
+sample_index = None
+storage_stats = StorageStats(STATS_FILE)
+startup = StartupTask()
+
+@startup.step("load dataset")
+def load_dataset():
+    global dataset, sample_index
+    if DATASET_NAME in fo.list_datasets():
+        dataset = fo.load_dataset(DATASET_NAME)
+        print(f"📂 Loaded existing dataset: {DATASET_NAME}")
+    else:
+        dataset = fo.Dataset(DATASET_NAME)
+        print(f"✨ Created new dataset: {DATASET_NAME}")
+    sample_index = SampleIndex(dataset)
 
 # ----------------------------
 # Assign random demo labels (only if missing)
 # ----------------------------
-def assign_demo_labels(ds):
+def assign_demo_labels(ds, sample_ids=None):
     weld_shapes = ["round", "square", "irregular"]
     noise_types = ["low_noise", "medium_noise", "high_noise"]
     colors = ["red", "blue", "green"]
 
-    for sample in ds:
-        if not sample.tags:  # Only assign if tags empty
-            chosen_labels = [
-                random.choice(weld_shapes),
-                random.choice(noise_types),
-                random.choice(colors),
-            ]
-            sample.tags.extend(chosen_labels)
-            sample.save()
+    # Only touch the given (newly added) samples, and only if tags are empty
+    view = ds.select(sample_ids) if sample_ids is not None else ds
+    ids = view.match(F("tags").length() == 0).values("id")
+    if not ids:
+        return
 
-assign_demo_labels(dataset)
-print("✅ Demo labels ensured!")
+    chosen_labels = {
+        sample_id: [
+            random.choice(weld_shapes),
+            random.choice(noise_types),
+            random.choice(colors),
+        ]
+        for sample_id in ids
+    }
+    ds.set_values("tags", chosen_labels, key_field="id")
+
+@startup.step("demo labels")
+def ensure_demo_labels():
+    assign_demo_labels(dataset)
+    print("✅ Demo labels ensured!")
 
 # ----------------------------
 # Add images from folders automatically (only missing ones)
 # ----------------------------
+def insert_folder_samples(samples):
+    """
+    add_many() the samples, then label, count and thumbnail only the ones it
+    actually inserted (the startup scan and the watcher can race on a file).
+    """
+    new_ids = set(sample_index.add_many(samples))
+    inserted = [s for s in samples if sample_index.get(s.filepath) in new_ids]
+    assign_demo_labels(dataset, list(new_ids))
+    storage_stats.record_many([(s.filepath, s.ground_truth.label) for s in inserted])
+    pregenerate_thumbnails([s.filepath for s in inserted])
+    return inserted
+
 def add_folder_images(base_path, split):
+    samples = []
     for label in ["good", "bad"]:
         folder_path = os.path.join(base_path, split, "images", label)
         if not os.path.exists(folder_path):
@@ -70,16 +158,55 @@ def add_folder_images(base_path, split):
         for filename in os.listdir(folder_path):
             if filename.lower().endswith((".jpg", ".jpeg", ".png")):
                 filepath = os.path.join(folder_path, filename)
-                if not any(s.filepath == filepath for s in dataset):
-                    sample = Sample(
-                        filepath=filepath, 
+                if filepath not in sample_index:
+                    samples.append(Sample(
+                        filepath=filepath,
                         ground_truth=Classification(label=label)
-                    )
-                    dataset.add_sample(sample)
-    assign_demo_labels(dataset)
+                    ))
+    insert_folder_samples(samples)
+
+# ----------------------------
+# Incremental folder sync (files added, deleted or moved between good/bad)
+# ----------------------------
+def apply_folder_changes(added, removed, moved):
+    samples = [Sample(filepath=path, ground_truth=Classification(label=label))
+               for path, label in added if path not in sample_index]
+    inserted = insert_folder_samples(samples)
+
+    relabeled = 0
+    for old_path, new_path, old_label, new_label in moved:
+        if sample_index.move(old_path, new_path, ground_truth=Classification(label=new_label)) is not None:
+            storage_stats.relabel(old_label, new_label)
+            relabeled += 1
 
-add_folder_images("dataset", "train")
-add_folder_images("dataset", "val")
+    removed = [(path, label, size) for path, label, size in removed if path in sample_index]
+    sample_index.remove_many([path for path, _, _ in removed])
+    storage_stats.remove_many([(size, label) for _, label, size in removed])
+    print(f"🔄 Dataset folders synced: {len(inserted)} added, {len(removed)} removed, {relabeled} moved")
+
+dataset_watcher = DatasetWatcher("dataset", apply_folder_changes,
+                                 debounce=DATASET_WATCH_DEBOUNCE, poll_interval=DATASET_WATCH_POLL)
+
+@startup.step("sync dataset folders")
+def sync_dataset_folders():
+    if DATASET_WATCH:
+        # Snapshot first, so files landing during the full scan below are still picked up
+        dataset_watcher.start()
+    splits = ("train", "val")
+    for i, split in enumerate(splits):
+        startup.progress(i, len(splits))
+        add_folder_images("dataset", split)
+    startup.progress(len(splits), len(splits))
+
+# ----------------------------
+# Storage stats (running totals, reconciled only when out of sync)
+# ----------------------------
+@startup.step("storage stats")
+def sync_storage_stats():
+    if storage_stats.is_stale(dataset):
+        storage_stats.reconcile(dataset)
+    if STATS_RECONCILE_INTERVAL > 0:
+        storage_stats.start_reconciler(dataset, STATS_RECONCILE_INTERVAL)
 
 # ----------------------------
 # Launch FiftyOne
@@ -87,59 +214,233 @@ add_folder_images("dataset", "val")
 def start_fiftyone():
     fo.launch_app(dataset, port=5151, remote=True, address="127.0.0.1")
 
-threading.Thread(target=start_fiftyone, daemon=True).start()
-print("✅ FiftyOne launching on http://127.0.0.1:5151")
+@startup.step("launch fiftyone")
+def launch_fiftyone():
+    threading.Thread(target=start_fiftyone, daemon=True).start()
+    print("✅ FiftyOne launching on http://127.0.0.1:5151")
+
+# With debug=True, `python app.py` runs this module twice: in the reloader's watcher
+# process and in the child that serves requests. Only the serving process may load
+# and sync the dataset, or both race on add_samples, the watcher and stats.json.
+RELOADER_PARENT = __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+if not RELOADER_PARENT:
+    startup.start()
 
 # ----------------------------
 # Serve images for React
 # ----------------------------
 @app.route("/dataset/<path:filename>")
 def serve_dataset_image(filename):
-    return send_from_directory("dataset", filename)
+    return send_cached_file("dataset", filename, max_age=DATASET_MAX_AGE, accel_prefix=DATASET_X_ACCEL_PREFIX)
+
+@app.route("/thumb/<int:size>/<path:filename>")
+def serve_thumbnail(size, filename):
+    if size not in THUMB_SIZES:
+        return {"error": f"Size must be one of {list(THUMB_SIZES)}"}, 400
+    path = safe_join("dataset", filename)
+    if path is None or not os.path.isfile(path):
+        return {"error": "Not found"}, 404
+
+    fmt = pick_format(request.headers.get("Accept"))
+    response = send_file(thumbnail_cache.get(path, size, fmt), conditional=True, max_age=86400)
+    response.vary.add("Accept")
+    return response
+
+directory_listing = DirectoryListing()
 
 @app.route("/list_images")
 def list_images():
-    folder = request.args.get("folder")  # e.g., "train/images/good"
-    folder_path = os.path.join("dataset", folder)
-    if not os.path.exists(folder_path):
-        return jsonify([])
-    files = [f for f in os.listdir(folder_path) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
-    return jsonify(files)
+    folder = request.args.get("folder", "")  # e.g., "train/images/good"
+    folder_path = safe_join("dataset", folder)
+    if folder_path is None:
+        return {"error": "Invalid folder"}, 400
+    files, version = directory_listing.list(folder_path)
+    return listing_response(files, version)
+
+@app.route("/images")
+def list_all_images():
+    folders = [f"{split}/images/{label}" for split in ("train", "val") for label in ("good", "bad")]
+    paths, version = directory_listing.list_many("dataset", folders)
+    return listing_response(paths, version)
+
+# ----------------------------
+# Background ingest (dedup, FiftyOne insert, inference)
+# ----------------------------
+upload_store = UploadStore(UPLOAD_FOLDER, UPLOAD_STORE_DB)
+
+def request_inference(filepath):
+    with open(filepath, "rb") as f:
+        data = f.read()
+    req = urllib.request.Request(f"{INGEST_INFERENCE_URL.rstrip('/')}/predict?format=rle", data=data,
+                                 headers={"Content-Type": "application/octet-stream"})
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        prediction = json.load(resp)
+    return {"seam_fraction": prediction["seam_fraction"], "cached": prediction.get("cached", False)}
+
+def ingest_upload(job):
+    # Same bytes -> same object path, so this also catches re-uploads under another name.
+    # add() is the dedup check itself: it returns None if any worker already inserted the path.
+    filepath = job["filepath"]
+    sample = Sample(filepath=filepath, ground_truth=Classification(label="unlabeled"),
+                    original_filename=job["filename"])
+    sample_id = sample_index.add(sample)
+    duplicate = sample_id is None
+    if not duplicate:
+        assign_demo_labels(dataset, [sample_id])
+        storage_stats.record(filepath, "unlabeled", upload=True, name=job["filename"])
+
+    result = {"filename": job["filename"], "label": "unlabeled", "sha256": job["sha256"], "duplicate": duplicate}
+    if INGEST_INFERENCE_URL:
+        try:
+            result["inference"] = request_inference(filepath)
+        except Exception as e:
+            result["inference_error"] = str(e)
+    return result
+
+ingest_jobs = JobQueue(ingest_upload, workers=INGEST_WORKERS, max_pending=INGEST_MAX_PENDING)
 
 # ----------------------------
 # Upload route
 # ----------------------------
 @app.route("/upload", methods=["POST"])
+@startup.require_ready
 def upload_file():
     if "file" not in request.files:
         return {"error": "No file part"}, 400
     file = request.files["file"]
     if file.filename == "":
         return {"error": "No selected file"}, 400
+    filename = secure_filename(file.filename)
+    if not filename:
+        return {"error": "Invalid filename"}, 400
+
+    # Only hash and store the body here; everything else happens on an ingest worker.
+    # A stored object whose job is rejected is simply found again on retry.
+    stored = upload_store.put(file.stream, filename)
+    try:
+        job = ingest_jobs.submit({"filepath": stored["path"], "filename": filename, "sha256": stored["sha256"]})
+    except queue.Full:
+        return {"error": "Upload queue is full, retry later"}, 503
+
+    return {
+        "message": "File accepted",
+        "filename": filename,
+        "label": "unlabeled",
+        "sha256": stored["sha256"],
+        "job_id": job["id"],
+        "status_url": f"/jobs/{job['id']}",
+    }, 202
 
-    filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(filepath)
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return {"error": "Unknown job"}, 404
+    return jsonify(job)
 
-    if not any(s.filepath == filepath for s in dataset):
-        sample = Sample(filepath=filepath, ground_truth=Classification(label="unlabeled"))
-        dataset.add_sample(sample)
-        assign_demo_labels(dataset)
+# ----------------------------
+# Batch upload (many multipart files, tar/zip parts, or a raw tar/zip body)
+# ----------------------------
+@app.route("/upload_batch", methods=["POST"])
+@startup.require_ready
+def upload_batch():
+    if request.files:
+        parts = [(f.stream, f.filename, f.mimetype) for key in request.files for f in request.files.getlist(key)]
+    elif archive_kind(content_type=request.content_type):
+        parts = [(request.stream, "", request.content_type)]
+    else:
+        return {"error": "Send multipart files or a tar/zip body"}, 400
+
+    results, samples, pending, seen = [], [], [], set()
+    for stream, part_name, content_type in parts:
+        # Archives are read member by member; nothing is buffered whole in memory
+        try:
+            for name, member in iter_upload(stream, part_name, content_type, spool_dir=upload_store.tmp_dir):
+                filename = secure_filename(os.path.basename(name))
+                if not filename or not is_image(filename):
+                    results.append({"filename": name, "status": "skipped", "reason": "not an image"})
+                    continue
+                if len(results) >= UPLOAD_BATCH_MAX_FILES:
+                    results.append({"filename": filename, "status": "skipped", "reason": "batch file limit"})
+                    continue
+
+                stored = upload_store.put(member, filename)
+                filepath, sha256 = stored["path"], stored["sha256"]
+                if filepath in sample_index or filepath in seen:
+                    results.append({"filename": filename, "status": "duplicate", "sha256": sha256})
+                    continue
+                seen.add(filepath)
+                samples.append(Sample(filepath=filepath, ground_truth=Classification(label="unlabeled"),
+                                      original_filename=filename))
+                pending.append({"filename": filename, "status": "added", "sha256": sha256, "label": "unlabeled"})
+                results.append(pending[-1])
+        except ARCHIVE_ERRORS as e:
+            # Complete members read before the damage are kept
+            results.append({"filename": part_name or "<request body>", "status": "error",
+                            "reason": f"corrupt or truncated archive: {e}"})
 
-    return {"message": "File uploaded", "filename": file.filename, "label": "unlabeled"}
+    # One add_samples call for the whole batch; a concurrent request may have
+    # inserted some of the same content in the meantime, so only count what this one added
+    new_ids = set(sample_index.add_many(samples))
+    added = []
+    for sample, result in zip(samples, pending):
+        if sample_index.get(sample.filepath) in new_ids:
+            added.append(sample)
+        else:
+            result["status"] = "duplicate"
+            del result["label"]
+    assign_demo_labels(dataset, list(new_ids))
+    storage_stats.record_many([(s.filepath, "unlabeled") for s in added], upload=True,
+                              names=[s.original_filename for s in added])
+
+    counts = {status: sum(r["status"] == status for r in results)
+              for status in ("added", "duplicate", "skipped", "error")}
+    if counts["error"] and counts["error"] == len(results):
+        return jsonify({**counts, "files": results}), 400
+    return jsonify({**counts, "files": results})
 
 # ----------------------------
 # Stats route
 # ----------------------------
 @app.route("/stats", methods=["GET"])
 def get_stats():
-    total_size = sum(os.path.getsize(s.filepath) for s in dataset) / 1e6
+    stats = storage_stats.snapshot()
+    total_size = stats["storage_bytes"] / 1e6
     return jsonify({
-        "active_users": 1,
+        "active_users": request_meter.active_users_today(),
         "total_datasets": 10,
-        "api_calls_today": 120,
-        "storage_used": f"{total_size:.2f} MB"
+        "api_calls_today": request_meter.calls_today(),
+        "storage_used": f"{total_size:.2f} MB",
+        "total_images": stats["count"],
+        "label_counts": {label: stats[label] for label in ("good", "bad", "unlabeled")},
+        "recent_uploads": stats["recent_uploads"],
     })
 
+# ----------------------------
+# Per-route call counts and latency percentiles
+# ----------------------------
+@app.route("/api_metrics", methods=["GET"])
+def get_api_metrics():
+    return jsonify(request_meter.route_summary(request.args.get("day")))
+
+# ----------------------------
+# Health check
+# ----------------------------
+@app.route("/health")
+def health_check():
+    # Liveness: healthy as soon as Flask is up, even while the dataset is still loading
+    status = startup.status()
+    return jsonify({
+        "status": "healthy" if status["status"] != "failed" else "failed",
+        "service": "backend",
+        "ready": startup.ready,
+        "startup": status,
+    }), 503 if status["status"] == "failed" else 200
+
+@app.route("/ready")
+def readiness_check():
+    return jsonify({"ready": startup.ready, "startup": startup.status()}), 200 if startup.ready else 503
+
 # ----------------------------
 # Run Flask
 # ----------------------------
@@ -0,0 +1,90 @@
+import math
+
+import torch
+import torch.nn.functional as F
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# ITU-R 601 luma weights, as torchvision's rgb_to_grayscale
+_GRAY_WEIGHTS = (0.299, 0.587, 0.114)
+
+
+class BatchAugment:
+    """
+    Augmentation applied to whole collated batches on the training device
+    instead of per sample in the Dataset. Takes uint8 images [B,3,H,W]
+    and targets (class labels [B] or masks [B,H,W]) and returns
+    (float images, targets):
+
+        uint8 -> [0,1] -> colour jitter -> normalize -> flips + rotation
+
+    Flips and rotation are folded into one affine matrix per sample and
+    resampled with a single affine_grid; masks reuse the same grid with
+    nearest sampling so they stay aligned with their images. Pixels
+    rotated in from outside are 0 after normalization (the mean colour)
+    and background (0) in masks, like F.rotate's default fill.
+    With every probability/range at 0 only conversion and normalization run,
+    which is what validation batches should use.
+    """
+
+    def __init__(self, mean=IMAGENET_MEAN, std=IMAGENET_STD, hflip=0.0, vflip=0.0, degrees=0.0,
+                 brightness=0.0, contrast=0.0, saturation=0.0):
+        self.mean = torch.tensor(mean).view(1, -1, 1, 1) if mean is not None else None
+        self.std = torch.tensor(std).view(1, -1, 1, 1) if std is not None else None
+        self.hflip = hflip
+        self.vflip = vflip
+        self.degrees = degrees
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+
+    @staticmethod
+    def _factors(amount, n, device):
+        """Per-sample multipliers uniform in [1 - amount, 1 + amount]."""
+        return torch.empty(n, 1, 1, 1, device=device).uniform_(max(0.0, 1 - amount), 1 + amount)
+
+    def _jitter(self, x):
+        n = x.size(0)
+        if self.brightness:
+            x = (x * self._factors(self.brightness, n, x.device)).clamp_(0, 1)
+        if self.contrast or self.saturation:
+            weights = torch.tensor(_GRAY_WEIGHTS, device=x.device).view(1, 3, 1, 1)
+        if self.contrast:
+            gray_mean = (x * weights).sum(1, keepdim=True).mean((2, 3), keepdim=True)
+            x = ((x - gray_mean) * self._factors(self.contrast, n, x.device) + gray_mean).clamp_(0, 1)
+        if self.saturation:
+            gray = (x * weights).sum(1, keepdim=True)
+            x = ((x - gray) * self._factors(self.saturation, n, x.device) + gray).clamp_(0, 1)
+        return x
+
+    def _theta(self, n, h, w, device):
+        """[n,2,3] affine matrices (output -> input, normalized coordinates)."""
+        angle = torch.empty(n, device=device).uniform_(-self.degrees, self.degrees) * (math.pi / 180)
+        cos, sin = torch.cos(angle), torch.sin(angle)
+        fx = torch.where(torch.rand(n, device=device) < self.hflip, -1.0, 1.0)
+        fy = torch.where(torch.rand(n, device=device) < self.vflip, -1.0, 1.0)
+        theta = torch.zeros(n, 2, 3, device=device)
+        # Rotate in pixel space: normalized coords are scaled by W/2 and H/2, so
+        # off-diagonal terms pick up the aspect ratio for non-square inputs
+        theta[:, 0, 0] = cos * fx
+        theta[:, 0, 1] = -sin * (h / w) * fy
+        theta[:, 1, 0] = sin * (w / h) * fx
+        theta[:, 1, 1] = cos * fy
+        return theta
+
+    def __call__(self, images, targets):
+        x = images.float().div_(255) if images.dtype == torch.uint8 else images.float()
+        x = self._jitter(x)
+        if self.mean is not None:
+            x = (x - self.mean.to(x.device)) / self.std.to(x.device)
+
+        if self.hflip or self.vflip or self.degrees:
+            n, _, h, w = x.shape
+            grid = F.affine_grid(self._theta(n, h, w, x.device), list(x.shape), align_corners=False)
+            x = F.grid_sample(x, grid, mode="bilinear", padding_mode="zeros", align_corners=False)
+            if targets.dim() == 3:  # dense masks follow their images
+                masks = F.grid_sample(targets.unsqueeze(1).float(), grid, mode="nearest",
+                                      padding_mode="zeros", align_corners=False)
+                targets = masks.squeeze(1).to(targets.dtype)
+        return x, targets
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import zlib
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+TAR_EXTS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+TAR_TYPES = ("application/x-tar", "application/gzip", "application/x-gzip", "application/x-bzip2",
+             "application/x-xz")
+ZIP_TYPES = ("application/zip", "application/x-zip-compressed")
+ZIP_SPOOL_BYTES = 16 * 1024 * 1024  # zip needs random access; bigger archives spill to disk
+# Corrupt or truncated archives; members yielded before the error were complete
+ARCHIVE_ERRORS = (tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error)
+
+
+def archive_kind(filename="", content_type=""):
+    """'tar', 'zip' or None from a file name or (raw body) content type."""
+    name = (filename or "").lower()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if name.endswith(TAR_EXTS) or content_type in TAR_TYPES:
+        return "tar"
+    if name.endswith(".zip") or content_type in ZIP_TYPES:
+        return "zip"
+    return None
+
+
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTS)
+
+
+def iter_tar(fileobj):
+    """
+    Yield (member name, file object) for image members of a tar stream
+    (any compression), reading strictly front to back (mode 'r|*'), so the
+    archive is never held in memory or needs a seekable source.
+    """
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            if member.isfile() and is_image(member.name):
+                yield member.name, tar.extractfile(member)
+
+
+def iter_zip(fileobj, spool_dir=None):
+    """
+    Yield (member name, file object) for image members of a zip. A
+    non-seekable stream is first spooled to a temp file (in memory up to
+    ZIP_SPOOL_BYTES) because the zip directory sits at the end.
+    """
+    spool = None
+    if not (hasattr(fileobj, "seekable") and fileobj.seekable()):
+        spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES, dir=spool_dir)
+        shutil.copyfileobj(fileobj, spool, 1 << 20)
+        spool.seek(0)
+        fileobj = spool
+    try:
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and is_image(info.filename):
+                    with zf.open(info) as member:
+                        yield info.filename, member
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+def iter_upload(fileobj, filename="", content_type="", spool_dir=None):
+    """(name, file object) pairs for one uploaded part: an archive's images, or the file itself."""
+    kind = archive_kind(filename, content_type)
+    if kind == "tar":
+        yield from iter_tar(fileobj)
+    elif kind == "zip":
+        yield from iter_zip(fileobj, spool_dir)
+    else:
+        yield os.path.basename(filename or ""), fileobj
@@ -0,0 +1,87 @@
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import make_seam_masks as msm
+from thinning import zhang_suen_thinning
+
+
+def morphological_skeleton(mask):
+    # The erode/dilate loop thin() used to fall back to, kept for comparison
+    skel = np.zeros_like(mask)
+    element = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+    working = mask.copy()
+    while cv2.countNonZero(working):
+        eroded = cv2.erode(working, element)
+        temp = cv2.subtract(working, cv2.dilate(eroded, element))
+        skel = cv2.bitwise_or(skel, temp)
+        working = eroded
+    return skel
+
+
+def thin_input(img_path):
+    """The mask process_one() hands to thin() for this image."""
+    img = msm.read_image(img_path)
+    gray = msm.enhance_contrast(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    edges = msm.detect_edges(gray)
+    h, w = edges.shape
+    lines = cv2.HoughLinesP(edges, 1, np.pi/180, msm.HOUGH_TH,
+                            minLineLength=int(min(h, w) * msm.MIN_LINE_FRAC),
+                            maxLineGap=msm.MAX_LINE_GAP)
+    line_mask = msm.merge_lines(lines, img.shape)
+    return edges if line_mask.sum() == 0 else line_mask
+
+
+def timed(fn, mask):
+    start = time.perf_counter()
+    out = fn(mask)
+    return out, (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare seam-mask thinning implementations")
+    parser.add_argument("--root", default=str(msm.ROOT_DIR))
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--dilate", type=int, default=0,
+                        help="thicken inputs first (px) to stress the iterative methods")
+    args = parser.parse_args()
+
+    imgs = sorted(p for p in Path(args.root).glob("*/images/*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    imgs = imgs[:args.limit]
+    if not imgs:
+        raise SystemExit(f"No images under {args.root}/*/images")
+
+    try:
+        import cv2.ximgproc as xi
+        methods = {"ximgproc": lambda m: xi.thinning(m, xi.THINNING_ZHANGSUEN)}
+    except Exception:
+        xi = None
+        methods = {}
+        print("[WARN] cv2.ximgproc not available; identity check against it is skipped")
+    methods["numpy_zhang_suen"] = zhang_suen_thinning
+    methods["morph_skeleton"] = morphological_skeleton
+
+    times = {name: [] for name in methods}
+    mismatches = 0
+    for img_path in imgs:
+        mask = thin_input(img_path)
+        if args.dilate:
+            k = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2*args.dilate+1, 2*args.dilate+1))
+            mask = cv2.dilate(mask, k)
+        outputs = {}
+        for name, fn in methods.items():
+            outputs[name], ms = timed(fn, mask)
+            times[name].append(ms)
+        if xi is not None and not np.array_equal(outputs["ximgproc"], outputs["numpy_zhang_suen"]):
+            mismatches += 1
+            print(f"  [DIFF] {img_path}")
+
+    print(f"\n{len(imgs)} masks from {args.root}")
+    for name, ts in times.items():
+        print(f"  {name:18s} median {statistics.median(ts):8.2f} ms   total {sum(ts)/1000:7.2f} s")
+    if xi is not None:
+        print(f"  numpy vs ximgproc: {len(imgs) - mismatches}/{len(imgs)} identical")
@@ -0,0 +1,264 @@
+import json
+import os
+import queue
+import random
+import shutil
+import threading
+
+import numpy as np
+import torch
+from torch.nn.parallel import DistributedDataParallel
+
+INDEX_NAME = "checkpoints.json"
+PREVIOUS_NAME = "previous"
+LAST_NAME = "last.pt"
+
+
+def add_arguments(parser, default_dir):
+    """Checkpoint/resume options for a trainer.build_parser() parser."""
+    parser.add_argument("--checkpoint-dir", default=default_dir,
+                        help="directory for last.pt, the best-N checkpoints and checkpoints.json")
+    parser.add_argument("--checkpoint-every", type=int, default=1,
+                        help="write last.pt every N epochs (new best checkpoints are always written)")
+    parser.add_argument("--keep-best", type=int, default=3,
+                        help="number of best checkpoints to retain")
+    parser.add_argument("--resume", nargs="?", const=LAST_NAME, default=None,
+                        help="resume from a checkpoint (default: last.pt in --checkpoint-dir)")
+    return parser
+
+
+def _to_cpu(obj):
+    """Detached CPU copy of every tensor in a (nested) state dict."""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+
+def _rng_state():
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def _set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def _unwrap(model):
+    return model.module if isinstance(model, DistributedDataParallel) else model
+
+
+class CheckpointManager:
+    """
+    Periodic training checkpoints (model, optimizer, scheduler, RNG, epoch
+    and any extra state) written from a background thread so the next epoch
+    starts while the previous one is still being saved.
+
+    State is copied to CPU on the calling thread, then torch.save()d to a
+    temp file and renamed over last.pt. When the metric ranks among the
+    best keep_best seen so far, last.pt is also hard-linked as
+    best-epochNNN.pt and the checkpoint it displaces is deleted; the ranking
+    lives in checkpoints.json so it survives restarts. That ranking is only
+    picked up with resume=True; a fresh run first moves the previous run's
+    checkpoints into previous/ so it never competes with (or load_best()s)
+    their weights. Pass enabled=False on non-zero DDP ranks: they can still
+    resume() but never write.
+    """
+
+    def __init__(self, directory, keep_best=3, mode="max", every=1, enabled=True, resume=False):
+        self.directory = directory
+        self.keep_best = keep_best
+        self.mode = mode
+        self.every = max(1, every)
+        self.enabled = enabled
+        self.best = []  # [{"epoch", "metric", "file"}], best first
+        self._queue = queue.Queue(maxsize=1)  # at most one checkpoint waiting behind the one being written
+        self._error = None
+        self._thread = None
+
+        index_path = os.path.join(directory, INDEX_NAME)
+        if resume:
+            if os.path.exists(index_path):
+                with open(index_path) as f:
+                    self.best = json.load(f).get("best", [])
+        elif enabled:
+            self._rotate()
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+
+    def _rotate(self):
+        """Move an earlier run's last.pt, best-*.pt and index into previous/ (replacing an older one)."""
+        if not os.path.isdir(self.directory):
+            return
+        names = [n for n in os.listdir(self.directory)
+                 if n in (LAST_NAME, INDEX_NAME) or (n.startswith("best-") and n.endswith(".pt"))]
+        if not names:
+            return
+        previous = os.path.join(self.directory, PREVIOUS_NAME)
+        shutil.rmtree(previous, ignore_errors=True)
+        os.makedirs(previous)
+        for name in names:
+            os.replace(os.path.join(self.directory, name), os.path.join(previous, name))
+        print(f"[Checkpoint] Moved the previous run's checkpoints to {previous}")
+
+    # ----------------------------
+    # Ranking
+    # ----------------------------
+    def _better(self, a, b):
+        return a > b if self.mode == "max" else a < b
+
+    def _ranked(self, entries):
+        return sorted(entries, key=lambda e: e["metric"], reverse=self.mode == "max")
+
+    def is_best(self, metric):
+        """True if metric would enter the retained best-N."""
+        if metric is None or self.keep_best <= 0:
+            return False
+        if len(self.best) < self.keep_best:
+            return True
+        return self._better(metric, self.best[-1]["metric"])
+
+    @property
+    def best_path(self):
+        return os.path.join(self.directory, self.best[0]["file"]) if self.best else None
+
+    @property
+    def best_metric(self):
+        return self.best[0]["metric"] if self.best else None
+
+    # ----------------------------
+    # Saving
+    # ----------------------------
+    def save(self, epoch, model, optimizer, scheduler=None, metric=None, extra=None, force=False):
+        """
+        Queue a checkpoint for `epoch` completed epochs. Written when epoch is
+        a multiple of `every`, when metric makes the best-N, or when forced
+        (e.g. the last epoch). Returns True if one was queued.
+        """
+        self._raise_pending()
+        best = self.is_best(metric)
+        if not self.enabled or not (force or best or epoch % self.every == 0):
+            return False
+
+        state = {
+            "epoch": epoch,
+            "metric": metric,
+            "model": _to_cpu(_unwrap(model).state_dict()),
+            "optimizer": _to_cpu(optimizer.state_dict()),
+            "scheduler": scheduler.state_dict() if scheduler is not None else None,
+            "rng": _rng_state(),
+            "extra": extra or {},
+        }
+        if best:
+            entry = {"epoch": epoch, "metric": metric, "file": f"best-epoch{epoch:03d}.pt"}
+            ranked = self._ranked([e for e in self.best if e["epoch"] != epoch] + [entry])
+            dropped = ranked[self.keep_best:]
+            self.best = ranked[:self.keep_best]
+            self._queue.put((state, entry["file"], [e["file"] for e in dropped], list(self.best)))
+        else:
+            self._queue.put((state, None, [], None))
+        return True
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            try:
+                self._write(*job)
+            except Exception as e:  # surfaced on the training thread by the next save()/wait()
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, state, best_file, dropped, best_index):
+        last = os.path.join(self.directory, LAST_NAME)
+        tmp = last + ".tmp"
+        torch.save(state, tmp)
+        os.replace(tmp, last)
+
+        if best_file:
+            best_path = os.path.join(self.directory, best_file)
+            if os.path.exists(best_path):
+                os.remove(best_path)
+            try:
+                os.link(last, best_path)  # same bytes, no second write
+            except OSError:
+                shutil.copyfile(last, best_path)
+            for name in dropped:
+                if name != best_file and os.path.exists(os.path.join(self.directory, name)):
+                    os.remove(os.path.join(self.directory, name))
+
+            index_tmp = os.path.join(self.directory, INDEX_NAME + ".tmp")
+            with open(index_tmp, "w") as f:
+                json.dump({"best": best_index}, f, indent=2)
+            os.replace(index_tmp, os.path.join(self.directory, INDEX_NAME))
+
+    def _raise_pending(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Background checkpoint write failed: {error}") from error
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        if self._thread is not None:
+            self._queue.join()
+        self._raise_pending()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_pending()
+
+    # ----------------------------
+    # Loading
+    # ----------------------------
+    def load(self, path=LAST_NAME):
+        if not os.path.isabs(path) and not os.path.exists(path):
+            path = os.path.join(self.directory, path)
+        return torch.load(path, map_location="cpu", weights_only=False)
+
+    def resume(self, model, optimizer=None, scheduler=None, path=LAST_NAME):
+        """
+        Restore model/optimizer/scheduler/RNG state from path (relative
+        names resolve inside the checkpoint directory). Returns
+        (completed epochs, extra state); (0, {}) if last.pt doesn't exist yet.
+        """
+        if path == LAST_NAME and not os.path.exists(os.path.join(self.directory, LAST_NAME)):
+            print(f"[Checkpoint] No {LAST_NAME} in {self.directory}, starting from scratch")
+            return 0, {}
+        state = self.load(path)
+        _unwrap(model).load_state_dict(state["model"])
+        if optimizer is not None:
+            optimizer.load_state_dict(state["optimizer"])
+        if scheduler is not None and state.get("scheduler") is not None:
+            scheduler.load_state_dict(state["scheduler"])
+        _set_rng_state(state["rng"])
+        print(f"[Checkpoint] Resumed from epoch {state['epoch']} ({path})")
+        return state["epoch"], state.get("extra", {})
+
+    def load_best(self, model):
+        """Load the best retained weights into model; returns False if there are none."""
+        self.wait()
+        if not self.best:
+            return False
+        _unwrap(model).load_state_dict(self.load(self.best[0]["file"])["model"])
+        return True
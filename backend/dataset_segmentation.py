@@ -1,14 +1,18 @@
 import os
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 from PIL import Image
 from torchvision import transforms
 
+from tensor_cache import open_or_build
+
 # Allowed image extensions
 IMG_EXTS = (".jpg", ".jpeg", ".png")
 
 class WeldDataset(Dataset):
-    def __init__(self, image_dir, mask_dir, transform=None, mask_transform=None):
+    def __init__(self, image_dir, mask_dir, transform=None, mask_transform=None,
+                 cache_dir=None, cache_size=None):
         self.image_dir = image_dir
         self.mask_dir = mask_dir
         self.transform = transform
@@ -49,15 +53,28 @@ class WeldDataset(Dataset):
 
         print(f"[WeldDataset] Loaded {len(self.image_paths)} samples from {image_dir}")
 
+        # Optional pre-resized uint8 copies in memory-mapped shards (see tensor_cache.py);
+        # shards need one shape, so cache_size (width, height) is required with cache_dir
+        self.cache = None
+        if cache_dir:
+            if cache_size is None:
+                raise ValueError("cache_size is required when cache_dir is set")
+            self.cache = open_or_build(list(zip(self.image_paths, self.mask_paths)), cache_dir,
+                                       cache_size, mask_resample=Image.BILINEAR)
+
     def __len__(self):
         return len(self.image_paths)
 
     def __getitem__(self, idx):
-        img_path = self.image_paths[idx]
-        mask_path = self.mask_paths[idx]
+        if self.cache is not None:
+            image_arr, mask_arr = self.cache[idx]
+            image, mask = Image.fromarray(np.asarray(image_arr)), Image.fromarray(np.asarray(mask_arr))
+        else:
+            img_path = self.image_paths[idx]
+            mask_path = self.mask_paths[idx]
 
-        image = Image.open(img_path).convert("RGB")
-        mask = Image.open(mask_path).convert("L")  # grayscale mask
+            image = Image.open(img_path).convert("RGB")
+            mask = Image.open(mask_path).convert("L")  # grayscale mask
 
         if self.transform:
             image = self.transform(image)
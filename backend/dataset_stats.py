@@ -0,0 +1,112 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+STATS_VERSION = 1
+
+
+def _file_digest(path, memo):
+    """sha256 of the file, memoized on (mtime, size) so unchanged files aren't re-read."""
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    entry = memo.get(key)
+    if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        return entry["sha256"], None
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    memo[key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest}
+    return digest, data
+
+
+def _pair_stats(img_data, mask_data, size, threshold):
+    """Channel sums and foreground counts for one pair at training resolution."""
+    with Image.open(io.BytesIO(img_data)) as img:
+        image = np.asarray(img.convert("RGB").resize(size, Image.BILINEAR), dtype=np.float64) / 255.0
+    with Image.open(io.BytesIO(mask_data)) as m:
+        mask = np.asarray(m.convert("L").resize(size, Image.NEAREST)) > threshold
+    pixels = image.shape[0] * image.shape[1]
+    fg = int(mask.sum())
+    return {
+        "pixels": pixels,
+        "fg_pixels": fg,
+        "channel_sum": image.sum(axis=(0, 1)).tolist(),
+        "channel_sumsq": np.square(image).sum(axis=(0, 1)).tolist(),
+    }
+
+
+def compute_stats(pairs, size, cache_path=None, threshold=128, workers=None):
+    """
+    Class pixel counts, per-channel mean/std and mask coverage over raw
+    (image, mask) pairs resized to size (width, height), in one threaded
+    pass. Per-pair results are cached in cache_path keyed by the sha256 of
+    both files, so later runs only read files that changed.
+    """
+    size = tuple(size)
+    cache = {"version": STATS_VERSION, "files": {}, "pairs": {}}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            loaded = json.load(f)
+        if loaded.get("version") == STATS_VERSION:
+            cache = loaded
+    memo, pair_cache = cache["files"], cache["pairs"]
+
+    def run(pair):
+        img_path, mask_path = pair
+        img_hash, img_data = _file_digest(img_path, memo)
+        mask_hash, mask_data = _file_digest(mask_path, memo)
+        key = f"{img_hash}:{mask_hash}:{size[0]}x{size[1]}:{threshold}"
+        if key not in pair_cache:
+            if img_data is None:
+                with open(img_path, "rb") as f:
+                    img_data = f.read()
+            if mask_data is None:
+                with open(mask_path, "rb") as f:
+                    mask_data = f.read()
+            pair_cache[key] = _pair_stats(img_data, mask_data, size, threshold)
+        return key
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        keys = list(pool.map(run, [(str(i), str(m)) for i, m in pairs]))
+
+    parts = [pair_cache[k] for k in keys]
+    total = sum(p["pixels"] for p in parts)
+    fg = sum(p["fg_pixels"] for p in parts)
+    csum = np.sum([p["channel_sum"] for p in parts], axis=0) if parts else np.zeros(3)
+    csumsq = np.sum([p["channel_sumsq"] for p in parts], axis=0) if parts else np.zeros(3)
+    mean = csum / max(total, 1)
+    std = np.sqrt(np.maximum(csumsq / max(total, 1) - mean ** 2, 0))
+
+    stats = {
+        "num_pairs": len(parts),
+        "size": list(size),
+        "total_pixels": total,
+        "class_pixels": [total - fg, fg],
+        "class_frequency": [(total - fg) / total, fg / total] if total else [0.0, 0.0],
+        "mask_coverage": sum(1 for p in parts if p["fg_pixels"]) / len(parts) if parts else 0.0,
+        "channel_mean": mean.tolist(),
+        "channel_std": std.tolist(),
+    }
+
+    if cache_path:
+        # Drop pairs that are no longer part of the dataset
+        live = set(keys)
+        live_files = {os.path.abspath(str(p)) for pair in pairs for p in pair}
+        cache["pairs"] = {k: v for k, v in pair_cache.items() if k in live}
+        cache["files"] = {k: v for k, v in memo.items() if k in live_files}
+        cache["stats"] = stats
+        tmp = f"{cache_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp, cache_path)
+    return stats
+
+
+def class_weights(stats):
+    """[background, foreground] weights: background 1, foreground total/foreground pixels."""
+    return [1.0, stats["total_pixels"] / (stats["class_pixels"][1] + 1e-6)]
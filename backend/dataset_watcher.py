@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+import traceback
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # no watchdog: fall back to polling directory mtimes
+    FileSystemEventHandler = object
+    Observer = None
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+# Events that can change a folder listing; watchdog also reports opened/closed-no-write
+# for every read of a dataset image, which must not trigger a rescan
+CHANGE_EVENTS = ("created", "deleted", "moved", "modified", "closed")
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type not in CHANGE_EVENTS:
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        dirs = [p if event.is_directory else os.path.dirname(p) for p in paths if p]
+        self.watcher._mark([f for f in self.watcher.folders for d in dirs
+                            if f == os.path.abspath(d) or f.startswith(os.path.abspath(d) + os.sep)])
+
+
+class DatasetWatcher:
+    """
+    Watches <base>/<split>/images/<label> folders and reports what changed,
+    so the dataset follows the filesystem without full rescans. Uses
+    watchdog (inotify on Linux) when installed, otherwise polls each
+    folder's mtime every poll_interval seconds. Changes are debounced:
+    folders are rescanned once no new event arrived for `debounce` seconds
+    (or after max_delay during a continuous storm), only the folders that
+    changed are listed, and the result is diffed against the last snapshot.
+
+    on_change(added, removed, moved) gets
+        added:   [(path, label)]
+        removed: [(path, label, size)]
+        moved:   [(old path, new path, old label, new label)]
+    A file that disappears from one folder and appears in another with the
+    same name and size in the same flush counts as moved (e.g. good -> bad).
+    If on_change raises, the snapshot is left as it was and the folders are
+    rescanned after the next debounce, so the same changes are reported again.
+    """
+
+    def __init__(self, base_path, on_change, splits=("train", "val"), labels=("good", "bad"),
+                 debounce=2.0, max_delay=30.0, poll_interval=5.0, use_watchdog=True):
+        self.on_change = on_change
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.base_path = os.path.abspath(base_path)
+        self.folders = {
+            os.path.join(self.base_path, split, "images", label): label
+            for split in splits for label in labels
+        }
+        self.mode = "watchdog" if use_watchdog and Observer is not None else "polling"
+
+        self._snapshot = {}  # path -> (size, mtime_ns)
+        self._folder_mtimes = {}
+        self._dirty = set()
+        self._first_event = self._last_event = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+
+    @staticmethod
+    def _folder_mtime(folder):
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _scan(folder):
+        entries = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file():
+                        st = entry.stat()
+                        entries[entry.path] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def start(self):
+        """Take the initial snapshot (synchronously), then watch in the background."""
+        for folder in self.folders:
+            self._folder_mtimes[folder] = self._folder_mtime(folder)
+            self._snapshot.update(self._scan(folder))
+
+        if self.mode == "watchdog":
+            os.makedirs(self.base_path, exist_ok=True)
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.base_path, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        threading.Thread(target=self._run, name="dataset-watcher", daemon=True).start()
+        print(f"👀 Watching {len(self.folders)} dataset folders ({self.mode}, {len(self._snapshot)} files)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _mark(self, folders):
+        if not folders:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._dirty.update(folders)
+            self._last_event = now
+            if self._first_event is None:
+                self._first_event = now
+        self._wake.set()
+
+    def _poll(self):
+        changed = []
+        for folder in self.folders:
+            mtime = self._folder_mtime(folder)
+            if mtime != self._folder_mtimes.get(folder):
+                self._folder_mtimes[folder] = mtime
+                changed.append(folder)
+        self._mark(changed)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            if self.mode == "polling":
+                self._poll()
+
+            now = time.monotonic()
+            with self._lock:
+                pending = bool(self._dirty)
+                quiet = now - self._last_event if pending else 0.0
+                waited = now - self._first_event if pending else 0.0
+            if pending and (quiet >= self.debounce or waited >= self.max_delay):
+                try:
+                    self._flush()
+                except Exception:
+                    traceback.print_exc()
+                continue
+
+            if pending:
+                timeout = min(self.debounce - quiet, self.max_delay - waited)
+            else:
+                timeout = self.poll_interval if self.mode == "polling" else None
+            self._wake.wait(timeout)
+
+    def _flush(self):
+        with self._lock:
+            folders, self._dirty = self._dirty, set()
+            self._first_event = self._last_event = None
+
+        current = {}
+        for folder in folders:
+            current.update(self._scan(folder))
+        before = {path: stat for path, stat in self._snapshot.items() if os.path.dirname(path) in folders}
+        added = [path for path in current if path not in before]
+        removed = [path for path in before if path not in current]
+
+        # Pair disappearances with appearances of the same file elsewhere
+        gone = {}
+        for path in removed:
+            gone.setdefault((os.path.basename(path), before[path][0]), []).append(path)
+        moved = []
+        for path in added:
+            candidates = gone.get((os.path.basename(path), current[path][0]))
+            if candidates:
+                old = candidates.pop()
+                moved.append((old, path, self.folders[os.path.dirname(old)], self.folders[os.path.dirname(path)]))
+        moved_old = {m[0] for m in moved}
+        moved_new = {m[1] for m in moved}
+
+        added = [(path, self.folders[os.path.dirname(path)]) for path in added if path not in moved_new]
+        removed = [(path, self.folders[os.path.dirname(path)], before[path][0])
+                   for path in removed if path not in moved_old]
+        if added or removed or moved:
+            try:
+                self.on_change(added, removed, moved)
+            except Exception:
+                # Keep the old snapshot and retry these folders after the next debounce
+                self._mark(folders)
+                raise
+
+        snapshot = {path: stat for path, stat in self._snapshot.items() if path not in before}
+        snapshot.update(current)
+        self._snapshot = snapshot
+
+    def status(self):
+        with self._lock:
+            pending = len(self._dirty)
+        return {"mode": self.mode, "files": len(self._snapshot), "pending_folders": pending}
@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from torchvision import models
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+EXPORT_DIR = "exports"
+IMG_EXTS = (".jpg", ".jpeg", ".png")
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+torch.set_grad_enabled(False)
+
+
+# ----------------------------
+# Model specs (architectures must match the training scripts)
+# ----------------------------
+def build_seam_path():
+    # train_seam_path.py
+    model = models.segmentation.deeplabv3_resnet50(weights=None, weights_backbone=None, aux_loss=False)
+    model.classifier[4] = nn.Conv2d(256, 2, kernel_size=1)
+    return model
+
+
+def build_deeplab_seam():
+    # train_deeplab.py (pretrained=True builds the aux head too)
+    model = models.segmentation.deeplabv3_resnet50(weights=None, weights_backbone=None, aux_loss=True)
+    model.classifier[4] = nn.Conv2d(256, 2, kernel_size=1)
+    return model
+
+
+def build_classifier():
+    # test_classifier.py
+    model = models.resnet18(weights=None)
+    model.fc = nn.Sequential(nn.Dropout(0.3), nn.Linear(model.fc.in_features, 2))
+    return model
+
+
+def seam_path_samples():
+    root = Path("unwelded_images/val")
+    masks = {m.stem: m for m in (root / "masks_clean").glob("*") if m.suffix.lower() in IMG_EXTS}
+    for img in sorted((root / "images").glob("*")):
+        if img.suffix.lower() in IMG_EXTS and img.stem in masks:
+            yield img, masks[img.stem]
+
+
+def deeplab_seam_samples():
+    images = {}
+    for root, _, files in os.walk("dataset/val/images"):
+        for f in files:
+            if f.lower().endswith(IMG_EXTS):
+                images[os.path.splitext(f)[0].lower()] = os.path.join(root, f)
+    for root, _, files in os.walk("dataset/val/masks"):
+        for f in sorted(files):
+            if f.lower().endswith(IMG_EXTS) and "_seam" in f.lower():
+                key = os.path.splitext(f)[0].lower().replace("_seam", "")
+                if key in images:
+                    yield images[key], os.path.join(root, f)
+
+
+def classifier_samples():
+    # ImageFolder order: bad=0, good=1
+    for idx, cls in enumerate(["bad", "good"]):
+        folder = os.path.join("dataset/val/images", cls)
+        if os.path.isdir(folder):
+            for f in sorted(os.listdir(folder)):
+                if f.lower().endswith(IMG_EXTS):
+                    yield os.path.join(folder, f), idx
+
+
+SPECS = {
+    "seam_path": {
+        "build": build_seam_path,
+        "checkpoint": "seam_path_model.pth",
+        "size": 320,  # train_seam_path.py IMG_SIZE, served at predict_seam_path.IMG_SIZE
+        "normalize": True,
+        "task": "segmentation",
+        "samples": seam_path_samples,
+    },
+    "deeplab_seam": {
+        "build": build_deeplab_seam,
+        "checkpoint": "deeplab_seam.pth",
+        "size": 256,
+        "normalize": False,
+        "task": "segmentation",
+        "samples": deeplab_seam_samples,
+    },
+    "classifier": {
+        "build": build_classifier,
+        "checkpoint": "classifier_resnet18_best.pth",
+        "size": 224,
+        "normalize": False,
+        "task": "classification",
+        "samples": classifier_samples,
+    },
+}
+
+
+class LogitsOnly(nn.Module):
+    """Segmentation models return a dict; tracing and ONNX want a plain tensor."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        out = self.model(x)
+        return out["out"] if isinstance(out, dict) else out
+
+
+# ----------------------------
+# Validation data
+# ----------------------------
+def load_image(path, spec):
+    img = Image.open(path).convert("RGB").resize((spec["size"], spec["size"]), Image.BILINEAR)
+    arr = np.asarray(img, dtype=np.float32) / 255.0
+    if spec["normalize"]:
+        arr = (arr - IMAGENET_MEAN) / IMAGENET_STD
+    return arr.transpose(2, 0, 1)
+
+
+def load_target(target, spec):
+    if spec["task"] == "classification":
+        return target
+    mask = Image.open(target).convert("L").resize((spec["size"], spec["size"]), Image.NEAREST)
+    return (np.asarray(mask) > 127).astype(np.uint8)
+
+
+def val_batches(spec, batch_size, limit=None):
+    """List of (float32 NCHW array, targets) batches from the validation split."""
+    samples = list(spec["samples"]())[:limit]
+    batches = []
+    for i in range(0, len(samples), batch_size):
+        chunk = samples[i:i + batch_size]
+        images = np.stack([load_image(p, spec) for p, _ in chunk])
+        targets = np.stack([load_target(t, spec) for _, t in chunk])
+        batches.append((images, targets))
+    return batches
+
+
+def score(logits, targets, task):
+    """Returns (correct-or-intersection, total-or-union) sums for the batch."""
+    preds = logits.argmax(axis=1)
+    if task == "classification":
+        return float((preds == targets).sum()), float(len(targets))
+    inter = float((preds * targets).sum())
+    return 2 * inter, float(preds.sum() + targets.sum())
+
+
+# ----------------------------
+# Backends: each is a callable float32 NCHW array -> logits array
+# ----------------------------
+def export_torchscript(wrapper, example, path):
+    traced = torch.jit.trace(wrapper, example)
+    frozen = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    frozen.save(str(path))
+    return lambda x: frozen(torch.from_numpy(x)).numpy()
+
+
+def export_onnx(wrapper, example, path):
+    torch.onnx.export(
+        wrapper, example, str(path),
+        input_names=["input"], output_names=["output"],
+        dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+        opset_version=18,
+    )
+
+
+def onnx_runner(path):
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+    return lambda x: session.run(None, {"input": x})[0]
+
+
+def quantize_onnx_int8(fp32_path, int8_path, calib_batches):
+    """Static INT8 (QDQ, per-channel) with activation ranges calibrated on val data."""
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static,
+    )
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = iter(images for images, _ in calib_batches)
+
+        def get_next(self):
+            images = next(self._it, None)
+            return None if images is None else {"input": images}
+
+    quantize_static(
+        str(fp32_path), str(int8_path), Reader(),
+        quant_format=QuantFormat.QDQ, per_channel=True,
+        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+    )
+
+
+def evaluate(run, batches, task, warmup=2):
+    for images, _ in batches[:warmup]:
+        run(images)
+    num, den, times, n = 0.0, 0.0, [], 0
+    for images, targets in batches:
+        start = time.perf_counter()
+        logits = run(images)
+        times.append((time.perf_counter() - start) / len(images))
+        n += len(images)
+        a, b = score(np.asarray(logits), targets, task)
+        num += a
+        den += b
+    return {
+        "metric": num / den if den else None,
+        "latency_ms_per_image": 1000 * statistics.median(times) if times else None,
+        "images": n,
+    }
+
+
+# ----------------------------
+# Pipeline
+# ----------------------------
+def export_model(name, checkpoint, out_dir, batch_size, val_limit, calib_batches, tolerance):
+    spec = SPECS[name]
+    out_dir = Path(out_dir) / name
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    model = spec["build"]()
+    model.load_state_dict(torch.load(checkpoint, map_location="cpu"))
+    wrapper = LogitsOnly(model).eval()
+
+    batches = val_batches(spec, batch_size, val_limit)
+    if not batches:
+        raise RuntimeError(f"No validation samples found for {name}")
+    example = torch.from_numpy(batches[0][0])
+
+    results = {}
+    results["eager_fp32"] = evaluate(lambda x: wrapper(torch.from_numpy(x)).numpy(), batches, spec["task"])
+
+    ts_path = out_dir / "model_torchscript.pt"
+    results["torchscript"] = evaluate(export_torchscript(wrapper, example, ts_path), batches, spec["task"])
+    results["torchscript"]["path"] = str(ts_path)
+
+    onnx_path = out_dir / "model_fp32.onnx"
+    export_onnx(wrapper, example, onnx_path)
+    try:
+        results["onnx_fp32"] = evaluate(onnx_runner(onnx_path), batches, spec["task"])
+        results["onnx_fp32"]["path"] = str(onnx_path)
+
+        int8_path = out_dir / "model_int8.onnx"
+        quantize_onnx_int8(onnx_path, int8_path, batches[:calib_batches])
+        results["onnx_int8"] = evaluate(onnx_runner(int8_path), batches, spec["task"])
+        results["onnx_int8"]["path"] = str(int8_path)
+    except ImportError:
+        print("⚠️ onnxruntime not installed; skipping ONNX evaluation and INT8 quantization")
+
+    # Fastest backend whose metric stays within tolerance of eager fp32
+    baseline = results["eager_fp32"]["metric"]
+    eligible = [k for k, r in results.items() if r["metric"] is not None and r["metric"] >= baseline - tolerance]
+    selected = min(eligible, key=lambda k: results[k]["latency_ms_per_image"])
+
+    report = {
+        "model": name,
+        "checkpoint": str(checkpoint),
+        "task": spec["task"],
+        "metric_name": "accuracy" if spec["task"] == "classification" else "dice",
+        "input_size": spec["size"],
+        "normalize": spec["normalize"],
+        "tolerance": tolerance,
+        "backends": results,
+        "selected": selected,
+    }
+    with open(out_dir / "report.json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def load_selected(name, export_dir=EXPORT_DIR):
+    """
+    Callable for the backend chosen in <export_dir>/<name>/report.json:
+    float NCHW tensor -> {"out": logits tensor}, a drop-in for the eager model.
+    Returns None if no export exists.
+    """
+    report_path = Path(export_dir) / name / "report.json"
+    if not report_path.exists():
+        return None
+    with open(report_path) as f:
+        report = json.load(f)
+
+    selected = report["selected"]
+    if selected == "eager_fp32":
+        return None
+    path = report["backends"][selected]["path"]
+    if selected == "torchscript":
+        module = torch.jit.load(path)
+        return lambda x: {"out": module(x.float().cpu())}
+    run = onnx_runner(path)
+    return lambda x: {"out": torch.from_numpy(run(x.float().cpu().contiguous().numpy()))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export TorchScript/ONNX/INT8 variants and pick the fastest")
+    parser.add_argument("--models", nargs="+", default=list(SPECS), choices=list(SPECS))
+    parser.add_argument("--checkpoint", action="append", default=[], metavar="NAME=PATH",
+                        help="override a default checkpoint path")
+    parser.add_argument("--out", default=EXPORT_DIR)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--val-limit", type=int, default=None, help="max validation images per model")
+    parser.add_argument("--calib-batches", type=int, default=16)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="max allowed Dice/accuracy drop")
+    args = parser.parse_args()
+
+    overrides = dict(item.split("=", 1) for item in args.checkpoint)
+    for name in args.models:
+        checkpoint = overrides.get(name, SPECS[name]["checkpoint"])
+        if not os.path.exists(checkpoint):
+            print(f"[SKIP] {name}: checkpoint {checkpoint} not found")
+            continue
+        report = export_model(name, checkpoint, args.out, args.batch_size,
+                              args.val_limit, args.calib_batches, args.tolerance)
+        print(f"\n{name} ({report['metric_name']}):")
+        for backend, r in report["backends"].items():
+            print(f"  {backend:12s} metric={r['metric']:.4f}  {r['latency_ms_per_image']:.1f} ms/img")
+        print(f"  ✅ selected: {report['selected']}")
@@ -0,0 +1,232 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torch.nn.functional as nnF
+from torchvision.io import decode_image, ImageReadMode
+
+from export_models import build_classifier, build_deeplab_seam
+from prediction_cache import PredictionCache, content_key, model_key
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+PREDICTIONS_DB = os.getenv("PREDICTIONS_DB", "predictions.db")
+CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", "classifier_resnet18_best.pth")  # test_classifier.py
+SEGMENTER_PATH = os.getenv("SEGMENTER_PATH", "segmentation_model.pth")  # train_segmental.py
+GOOD_THRESHOLD = float(os.getenv("HYBRID_GOOD_THRESHOLD", "0.9"))  # segment unless P(good) >= this
+CLASSIFIER_SIZE = (224, 224)
+SEGMENTER_SIZE = (256, 256)
+CLASS_NAMES = ("Bad", "Good")  # ImageFolder order of train/images/{bad,good}
+HYBRID_WEIGHTS = (0.4, 0.6)  # classification confidence, defect fraction
+IMG_EXTS = (".jpg", ".jpeg", ".png")
+
+
+# ----------------------------
+# predictions.db
+# ----------------------------
+class PredictionStore:
+    """Append-only writer for the predictions table (WAL, one executemany per batch)."""
+
+    def __init__(self, db_path=PREDICTIONS_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT,
+                classification_label TEXT,
+                classification_confidence REAL,
+                defect_fraction REAL,
+                hybrid_score REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._conn.commit()
+
+    def insert_many(self, rows):
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO predictions (filename, classification_label, classification_confidence, "
+                "defect_fraction, hybrid_score) VALUES (?, ?, ?, ?, ?)",
+                [(r["filename"], r["classification_label"], r["classification_confidence"],
+                  r["defect_fraction"], r["hybrid_score"]) for r in rows],
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+# ----------------------------
+# Pipeline
+# ----------------------------
+def load_weights(model, checkpoint, device):
+    model.load_state_dict(torch.load(checkpoint, map_location=device))
+    return model.to(device).eval()
+
+
+def resize_batch(images, size):
+    """list of uint8 CHW tensors (any size) -> float NCHW batch in [0, 1], like Resize + ToTensor."""
+    return torch.stack([
+        nnF.interpolate(img.unsqueeze(0).float() / 255.0, size=size, mode="bilinear",
+                        align_corners=False, antialias=True)[0]
+        for img in images
+    ])
+
+
+class HybridPipeline:
+    """
+    Classify every image with the ResNet18 classifier, then run the DeepLab
+    defect segmenter only on images whose P(good) is below good_threshold.
+    Confidently-good welds get defect_fraction 0 without touching the
+    segmenter; hybrid_score = 0.4 * confidence + 0.6 * defect_fraction,
+    the same weighting as the rows already in predictions.db.
+    """
+
+    def __init__(self, classifier_path=CLASSIFIER_PATH, segmenter_path=SEGMENTER_PATH,
+                 good_threshold=GOOD_THRESHOLD, device=None):
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.good_threshold = good_threshold
+        self.classifier = load_weights(build_classifier(), classifier_path, self.device)
+        self.segmenter = load_weights(build_deeplab_seam(), segmenter_path, self.device)
+        self.good_index = CLASS_NAMES.index("Good")
+        # Cache identity: both checkpoints plus the threshold that decides segmentation
+        self.model_key = model_key(classifier_path, segmenter_path, good_threshold=good_threshold)
+
+    @torch.inference_mode()
+    def classify(self, images):
+        """-> [N, 2] class probabilities."""
+        logits = self.classifier(resize_batch(images, CLASSIFIER_SIZE).to(self.device))
+        return logits.float().softmax(dim=1).cpu()
+
+    @torch.inference_mode()
+    def segment(self, images):
+        """-> [N] fraction of pixels predicted as defect (at segmenter resolution)."""
+        logits = self.segmenter(resize_batch(images, SEGMENTER_SIZE).to(self.device))["out"]
+        return (logits.argmax(dim=1) == 1).float().mean(dim=(1, 2)).cpu()
+
+    def predict(self, names, images):
+        """Rows for one batch of decoded images (uint8 RGB CHW tensors)."""
+        probs = self.classify(images)
+        confidence, label_idx = probs.max(dim=1)
+        suspicious = [i for i in range(len(images)) if probs[i, self.good_index] < self.good_threshold]
+
+        defect_fraction = torch.zeros(len(images))
+        if suspicious:
+            defect_fraction[suspicious] = self.segment([images[i] for i in suspicious])
+
+        rows = []
+        for i, name in enumerate(names):
+            conf, frac = float(confidence[i]), float(defect_fraction[i])
+            rows.append({
+                "filename": name,
+                "classification_label": CLASS_NAMES[int(label_idx[i])],
+                "classification_confidence": conf,
+                "defect_fraction": frac,
+                "hybrid_score": HYBRID_WEIGHTS[0] * conf + HYBRID_WEIGHTS[1] * frac,
+                "segmented": i in suspicious,
+                "cached": False,
+            })
+        return rows
+
+    def run(self, paths, store=None, batch_size=16, workers=4, cache=None):
+        """
+        Predict every path in batches, reading and decoding the next batch on
+        a thread pool while the current one runs, and write each batch to
+        store. With a PredictionCache, images whose bytes were already seen
+        under the same checkpoints skip decoding and both models.
+        Yields the rows of each batch.
+        """
+        def read(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            key = content_key(data)
+            hit = cache.get(key) if cache is not None else None
+            image = None
+            if hit is None:
+                image = decode_image(torch.frombuffer(bytearray(data), dtype=torch.uint8), mode=ImageReadMode.RGB)
+            return key, hit, image
+
+        batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=1) as prefetch:
+            load = lambda batch_paths: list(pool.map(read, batch_paths))
+            pending = prefetch.submit(load, batches[0]) if batches else None
+            for i, batch_paths in enumerate(batches):
+                loaded = pending.result()
+                if i + 1 < len(batches):
+                    pending = prefetch.submit(load, batches[i + 1])
+
+                names = [os.path.basename(p) for p in batch_paths]
+                rows = [dict(hit[0], filename=name, cached=True) if hit is not None else None
+                        for name, (_, hit, _) in zip(names, loaded)]
+                misses = [j for j, row in enumerate(rows) if row is None]
+                if misses:
+                    fresh = self.predict([names[j] for j in misses], [loaded[j][2] for j in misses])
+                    for j, row in zip(misses, fresh):
+                        rows[j] = row
+                    if cache is not None:
+                        cache.put_many([
+                            (loaded[j][0], {k: v for k, v in row.items() if k not in ("filename", "cached")}, None)
+                            for j, row in zip(misses, fresh)
+                        ])
+
+                if store is not None:
+                    store.insert_many(rows)
+                yield rows
+
+
+def collect_paths(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMG_EXTS))
+        elif item.lower().endswith(IMG_EXTS):
+            paths.append(item)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify, then segment suspicious welds, into predictions.db")
+    parser.add_argument("inputs", nargs="+", help="image files and/or directories")
+    parser.add_argument("--db", default=PREDICTIONS_DB)
+    parser.add_argument("--classifier", default=CLASSIFIER_PATH)
+    parser.add_argument("--segmenter", default=SEGMENTER_PATH)
+    parser.add_argument("--good-threshold", type=float, default=GOOD_THRESHOLD,
+                        help="skip segmentation when P(good) is at least this")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="image decoding threads")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the prediction cache")
+    args = parser.parse_args()
+
+    paths = collect_paths(args.inputs)
+    pipeline = HybridPipeline(args.classifier, args.segmenter, args.good_threshold)
+    store = PredictionStore(args.db)
+    cache = None
+    if not args.no_cache:
+        cache = PredictionCache(pipeline.model_key, namespace="hybrid",
+                                db_path=os.path.join(os.path.dirname(args.db) or ".", "prediction_cache.db"))
+
+    start = time.perf_counter()
+    total = segmented = cached = 0
+    for rows in pipeline.run(paths, store, args.batch_size, args.workers, cache):
+        total += len(rows)
+        segmented += sum(r["segmented"] and not r["cached"] for r in rows)
+        cached += sum(r["cached"] for r in rows)
+    store.close()
+    if cache is not None:
+        cache.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {total} images -> {args.db} in {elapsed:.1f}s "
+          f"({1000 * elapsed / max(total, 1):.0f} ms/image); "
+          f"segmented {segmented} suspicious, {cached} served from cache")
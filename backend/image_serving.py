@@ -0,0 +1,43 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, abort, request, send_file
+from werkzeug.utils import safe_join
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def file_version(path):
+    """Cheap content version from mtime + size, used for ETags and ?v= URLs."""
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def send_cached_file(directory, filename, max_age=3600, accel_prefix=None):
+    """
+    Serve directory/filename with a strong ETag, conditional GET and Range
+    support. URLs carrying ?v=<current version> are cached as immutable.
+    With accel_prefix set, only headers are sent and nginx streams the bytes
+    from its internal location via X-Accel-Redirect.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    version = file_version(path)
+    if request.args.get("v") == version:
+        cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        cache_control = f"public, max-age={max_age}"
+
+    if accel_prefix:
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream")
+        response.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + quote(filename)
+        response.set_etag(version)
+    else:
+        response = send_file(path, conditional=True, etag=version)
+
+    response.headers["Cache-Control"] = cache_control
+    response.headers["X-Content-Version"] = version
+    return response
@@ -0,0 +1,197 @@
+import base64
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import torch.nn.functional as nnF
+from flask import Flask, request, jsonify
+from PIL import Image
+from torchvision.io import decode_image, ImageReadMode
+
+import predict_seam_path
+import tiled_inference
+from export_models import load_selected
+from prediction_cache import PredictionCache, content_key, model_key
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+MODEL_PATH = os.getenv("SEAM_MODEL_PATH", predict_seam_path.MODEL_PATH)
+EXPORT_DIR = os.getenv("SEAM_EXPORT_DIR")  # use the backend picked by export_models.py
+MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "8"))
+MAX_LATENCY_MS = float(os.getenv("INFERENCE_MAX_LATENCY_MS", "25"))
+PORT = int(os.getenv("INFERENCE_PORT", "5003"))
+# Sliding-window mode for full-resolution masks (?tiled=1 per request, or on by default).
+# Exported graphs take a fixed IMG_SIZE input, so tiles default to that size with SEAM_EXPORT_DIR.
+TILED_DEFAULT = os.getenv("INFERENCE_TILED", "0") == "1"
+TILE_SIZE = int(os.getenv("INFERENCE_TILE_SIZE",
+                          predict_seam_path.IMG_SIZE[0] if EXPORT_DIR else tiled_inference.TILE_SIZE))
+TILE_OVERLAP = float(os.getenv("INFERENCE_TILE_OVERLAP", tiled_inference.TILE_OVERLAP))
+TILE_BATCH = int(os.getenv("INFERENCE_TILE_BATCH", tiled_inference.TILE_BATCH))
+CACHE_ENABLED = os.getenv("INFERENCE_CACHE", "1") == "1"
+
+
+# ----------------------------
+# Dynamic micro-batching
+# ----------------------------
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches of up to max_batch items,
+    waiting at most max_latency_ms after the first item arrives, and runs
+    them through batch_fn (list of inputs -> list of outputs) on one thread.
+    """
+
+    def __init__(self, batch_fn, max_batch=8, max_latency_ms=25):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000.0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            items, futures = zip(*batch)
+            try:
+                results = self.batch_fn(list(items))
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+
+
+# ----------------------------
+# Mask encoding
+# ----------------------------
+def mask_to_png(mask):
+    buf = io.BytesIO()
+    Image.fromarray(mask.astype(np.uint8) * 255, mode="L").save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def mask_to_rle(mask):
+    """Row-major run lengths, starting with a (possibly empty) run of zeros."""
+    flat = mask.reshape(-1).astype(np.uint8)
+    change = np.flatnonzero(np.diff(flat)) + 1
+    bounds = np.concatenate(([0], change, [flat.size]))
+    counts = np.diff(bounds).tolist()
+    if flat.size and flat[0] == 1:
+        counts = [0] + counts
+    return {"size": list(mask.shape), "counts": counts}
+
+
+# ----------------------------
+# Model + batch function
+# ----------------------------
+model = load_selected("seam_path", EXPORT_DIR) if EXPORT_DIR else None
+if model is None:
+    model = predict_seam_path.load_model(MODEL_PATH)
+
+# Keyed on the checkpoint (and export selection) so deploying a new model invalidates it
+cache = None
+if CACHE_ENABLED:
+    cache = PredictionCache(model_key(
+        MODEL_PATH, os.path.join(EXPORT_DIR, "seam_path", "report.json") if EXPORT_DIR else None,
+        input_size=predict_seam_path.IMG_SIZE, normalize=True), namespace="seam_path")
+
+
+def run_batch(images):
+    """images: list of uint8 RGB CHW tensors -> list of HxW {0,1} masks at native size."""
+    batch = torch.stack([predict_seam_path.preprocess(img) for img in images])
+    logits = predict_seam_path.predict_batch(batch, model).float().cpu()
+    masks = []
+    for img, out in zip(images, logits):
+        out = nnF.interpolate(out.unsqueeze(0), size=img.shape[1:], mode="bilinear", align_corners=False)
+        masks.append(out.argmax(dim=1)[0].numpy().astype(np.uint8))
+    return masks
+
+
+batcher = MicroBatcher(run_batch, max_batch=MAX_BATCH, max_latency_ms=MAX_LATENCY_MS)
+
+# Tiled requests already batch their own tiles; run them one at a time so
+# concurrent large images don't oversubscribe the CPU threads
+_tiled_lock = threading.Lock()
+
+
+def run_tiled(image):
+    with _tiled_lock:
+        return predict_seam_path.predict_mask(image, model, tiled=True, tile_size=TILE_SIZE,
+                                              overlap=TILE_OVERLAP, tile_batch=TILE_BATCH)
+
+# ----------------------------
+# Flask app
+# ----------------------------
+app = Flask(__name__)
+
+
+@app.route("/predict", methods=["POST"])
+def predict():
+    if "file" in request.files:
+        data = request.files["file"].read()
+    else:
+        data = request.get_data()
+    if not data:
+        return {"error": "No image data"}, 400
+
+    tiled = request.args.get("tiled", "1" if TILED_DEFAULT else "0") == "1"
+    key = content_key(data, "tiled", TILE_SIZE, TILE_OVERLAP) if tiled else content_key(data)
+    hit = cache.get(key) if cache is not None else None
+
+    if hit is not None:
+        result, mask = hit
+        result = dict(result, cached=True)
+    else:
+        try:
+            image = decode_image(torch.frombuffer(bytearray(data), dtype=torch.uint8), mode=ImageReadMode.RGB)
+        except RuntimeError:
+            return {"error": "Could not decode image"}, 400
+
+        mask = run_tiled(image) if tiled else batcher.submit(image).result()
+        result = {
+            "width": int(mask.shape[1]),
+            "height": int(mask.shape[0]),
+            "seam_fraction": float(mask.mean()),
+            "tiled": tiled,
+        }
+        if cache is not None:
+            cache.put(key, result, mask)
+        result = dict(result, cached=False)
+
+    if request.args.get("format", "png") == "rle":
+        result["mask_rle"] = mask_to_rle(mask)
+    else:
+        result["mask_png"] = base64.b64encode(mask_to_png(mask)).decode()
+    return jsonify(result)
+
+
+@app.route("/health")
+def health_check():
+    return jsonify({"status": "healthy", "service": "inference", "max_batch": MAX_BATCH,
+                    "tiled_default": TILED_DEFAULT, "tile_size": TILE_SIZE,
+                    "cache": cache.stats() if cache is not None else None})
+
+
+if __name__ == "__main__":
+    # threaded so concurrent requests can share a batch
+    app.run(host="0.0.0.0", port=PORT, threaded=True)
@@ -0,0 +1,82 @@
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+
+class JobQueue:
+    """
+    Bounded background worker pool for request work that doesn't need to
+    finish before the response (hashing, dataset inserts, thumbnails,
+    inference). submit() returns immediately with a job id; raises
+    queue.Full when max_pending jobs are already waiting so callers can
+    answer 503 instead of queueing without bound. The last `history`
+    finished jobs stay queryable via get().
+    """
+
+    def __init__(self, handler, workers=2, max_pending=256, history=1000, name="ingest"):
+        self.handler = handler
+        self.history = history
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True).start()
+
+    def submit(self, payload):
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+        try:
+            self._queue.put_nowait((job["id"], payload))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job["id"]]
+            raise
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+            if fields.get("status") in ("done", "failed"):
+                self._trim()
+
+    def _trim(self):
+        finished = [jid for jid, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for jid in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[jid]
+
+    def _worker(self):
+        while True:
+            job_id, payload = self._queue.get()
+            self._update(job_id, status="running", started_at=time.time())
+            try:
+                result = self.handler(payload)
+                self._update(job_id, status="done", result=result, finished_at=time.time())
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"pending": self._queue.qsize(), "jobs": counts}
@@ -0,0 +1,114 @@
+import base64
+import bisect
+import hashlib
+import os
+import threading
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+MAX_PAGE_SIZE = 1000
+
+
+class DirectoryListing:
+    """
+    Sorted image listings per directory, reused until the directory's mtime
+    changes or a writer calls invalidate().
+    """
+
+    def __init__(self, exts=IMAGE_EXTS):
+        self.exts = exts
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def list(self, folder):
+        """Return (sorted filenames, version) for folder; ([], None) if missing."""
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            return [], None
+
+        cached = self._cache.get(folder)
+        if cached and cached[1] == mtime:
+            return cached[0], cached[2]
+
+        names = sorted(f for f in os.listdir(folder) if f.lower().endswith(self.exts))
+        version = f"{mtime}-{len(names)}"
+        with self._lock:
+            self._cache[folder] = (names, mtime, version)
+        return names, version
+
+    def list_many(self, base, folders):
+        """Merged, sorted listing of several folders as paths relative to base."""
+        paths, versions = [], []
+        for folder in folders:
+            names, version = self.list(os.path.join(base, folder))
+            paths.extend(f"{folder}/{name}" for name in names)
+            versions.append(f"{folder}:{version}")
+        key = ("many", base, tuple(versions))
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = (sorted(paths), "|".join(versions))
+            with self._lock:
+                # Drop merged listings built from older versions
+                for k in [k for k in self._cache if k[:2] == ("many", base)]:
+                    del self._cache[k]
+                self._cache[key] = cached
+        return cached
+
+    def invalidate(self, folder=None):
+        with self._lock:
+            if folder is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(folder, None)
+
+
+def encode_cursor(name):
+    return base64.urlsafe_b64encode(name.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(padded.encode()).decode()
+
+
+def paginate(names, cursor=None, limit=None):
+    """Keyset pagination over a sorted list: the cursor is the last name returned."""
+    start = bisect.bisect_right(names, decode_cursor(cursor)) if cursor else 0
+    if limit is None:
+        return names[start:], None
+    page = names[start:start + limit]
+    more = start + limit < len(names)
+    return page, (encode_cursor(page[-1]) if page and more else None)
+
+
+def listing_response(names, version):
+    """
+    JSON array of names for the current request's ?cursor=&limit= page, with
+    X-Next-Cursor / X-Total-Count headers and ETag-based 304 handling.
+    Without limit the whole listing is returned, as before.
+    """
+    from flask import Response, jsonify, request
+
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    etag = hashlib.sha1(f"{version}|{cursor}|{limit}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    try:
+        page, next_cursor = paginate(names, cursor, limit)
+    except ValueError:
+        return {"error": "Invalid cursor"}, 400
+
+    response = jsonify(page)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Total-Count"] = str(len(names))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
@@ -1,11 +1,20 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
 from pathlib import Path
 from PIL import Image
+from tensor_cache import open_or_build
 import torch
 from torch.utils.data import Dataset, DataLoader
 from torchvision import transforms
 
+from thinning import zhang_suen_thinning
+
 # ---------- Config ----------
 ROOT_DIR = Path("unwelded_images")   # root containing train/ and val/
 SPLITS = ["train", "val"]            # the splits we expect
@@ -21,6 +30,8 @@ MIN_LINE_FRAC = 0.15
 MAX_LINE_GAP  = 10
 DILATE_PX     = 2
 
+MANIFEST_NAME = "manifest.json"      # per-split record of what produced each mask
+
 # ------------------ Mask Generation ------------------
 
 def read_image(path):
@@ -48,7 +59,7 @@ def merge_lines(lines, img_shape):
         return mask
     h, w = img_shape[:2]
     cx = w // 2  # center x
-    for x1, y1, x2, y2 in lines[:,0,:]:
+    for x1, y1, x2, y2 in lines.reshape(-1, 4):
         # keep lines near center
         if abs((x1+x2)//2 - cx) < w * 0.4:
             angle = np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi
@@ -61,19 +72,8 @@ def thin(mask):
         import cv2.ximgproc as xi
         return xi.thinning(mask, xi.THINNING_ZHANGSUEN)
     except Exception:
-        # morphological skeleton as fallback
-        skel = np.zeros_like(mask)
-        element = cv2.getStructuringElement(cv2.MORPH_CROSS, (3,3))
-        done = False
-        working = mask.copy()
-        while not done:
-            eroded = cv2.erode(working, element)
-            temp = cv2.dilate(eroded, element)
-            temp = cv2.subtract(working, temp)
-            skel = cv2.bitwise_or(skel, temp)
-            working = eroded.copy()
-            done = (cv2.countNonZero(working) == 0)
-        return skel
+        # same Zhang-Suen result, vectorized with NumPy (slim builds lack ximgproc)
+        return zhang_suen_thinning(mask)
 
 def process_one(img_path, mask_dir):
     img = read_image(img_path)
@@ -103,7 +103,59 @@ def process_one(img_path, mask_dir):
     cv2.imwrite(str(out_path), seam_mask)
     return out_path
 
-def generate_masks():
+def mask_params():
+    # Everything that changes the generated mask; bump when process_one changes
+    return {
+        "version": 2,
+        "IMG_MAX_W": IMG_MAX_W, "CANNY_LO": CANNY_LO, "CANNY_HI": CANNY_HI,
+        "HOUGH_TH": HOUGH_TH, "MIN_LINE_FRAC": MIN_LINE_FRAC,
+        "MAX_LINE_GAP": MAX_LINE_GAP, "DILATE_PX": DILATE_PX,
+    }
+
+def params_hash():
+    return hashlib.sha256(json.dumps(mask_params(), sort_keys=True).encode()).hexdigest()[:16]
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest(mask_dir):
+    path = mask_dir / MANIFEST_NAME
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(mask_dir, manifest):
+    path = mask_dir / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def _mask_task(task):
+    """Runs in a worker: skip if image bytes + params match the manifest, else regenerate."""
+    img_path, mask_dir, prev, phash, force = task
+    try:
+        digest = file_hash(img_path)
+        mask_path = mask_dir / (img_path.stem + ".png")
+        if (not force and prev and prev.get("hash") == digest
+                and prev.get("params") == phash and mask_path.exists()):
+            return img_path.name, "skipped", prev
+        out = process_one(img_path, mask_dir)
+        return img_path.name, "ok", {"hash": digest, "params": phash, "mask": out.name}
+    except Exception as e:
+        return img_path.name, "failed", str(e)
+
+def generate_masks(workers=1, force=False):
+    phash = params_hash()
+    start = time.time()
+    summary = {"ok": 0, "skipped": 0, "failed": 0}
+    failures = []
+
     for split in SPLITS:
         split_dir = ROOT_DIR / split / "images"
         mask_dir  = ROOT_DIR / split / MASK_SUBDIR
@@ -115,20 +167,38 @@ def generate_masks():
             print(f"[WARN] No images in {split_dir}")
             continue
 
-        print(f"Processing {len(imgs)} images in {split_dir}...")
-        for img_path in imgs:
-            try:
-                out = process_one(img_path, mask_dir)
-                print(f"  [OK] {img_path.name} -> {out.name}")
-            except Exception as e:
-                print(f"  [FAIL] {img_path.name}: {e}")
-
-    print("Done. Masks generated in masks_clean/.")
+        manifest = load_manifest(mask_dir)
+        tasks = [(p, mask_dir, manifest.get(p.name), phash, force) for p in imgs]
+        print(f"Processing {len(imgs)} images in {split_dir} with {workers} worker(s)...")
+
+        if workers > 1:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_mask_task, tasks, chunksize=chunksize))
+        else:
+            results = [_mask_task(t) for t in tasks]
+
+        new_manifest = {}
+        for name, status, info in results:
+            summary[status] += 1
+            if status == "failed":
+                failures.append((f"{split}/{name}", info))
+            else:
+                new_manifest[name] = info
+        save_manifest(mask_dir, new_manifest)
+
+    print(f"Done in {time.time() - start:.1f}s: {summary['ok']} generated, "
+          f"{summary['skipped']} unchanged, {summary['failed']} failed. Masks in {MASK_SUBDIR}/.")
+    for name, err in failures[:20]:
+        print(f"  [FAIL] {name}: {err}")
+    if len(failures) > 20:
+        print(f"  ... and {len(failures) - 20} more failures")
+    return summary
 
 # ------------------ Dataset for Training ------------------
 
 class SeamDataset(Dataset):
-    def __init__(self, images_dir, masks_dir, transform=None):
+    def __init__(self, images_dir, masks_dir, transform=None, cache_dir=None):
         self.images_dir = Path(images_dir)
         self.masks_dir = Path(masks_dir)
         self.transform = transform
@@ -141,19 +211,29 @@ class SeamDataset(Dataset):
         self.images = [img for img in sorted(self.images_dir.iterdir()) 
                        if img.suffix.lower() in {".jpg",".jpeg",".png"} and img.stem in self.masks_map]
 
+        # Optional pre-resized uint8 copies in memory-mapped shards (see tensor_cache.py)
+        self.cache = None
+        if cache_dir:
+            pairs = [(img, self.masks_map[img.stem]) for img in self.images]
+            self.cache = open_or_build(pairs, cache_dir, IMG_SIZE)
+
     def __len__(self):
         return len(self.images)
 
     def __getitem__(self, idx):
-        img_path = self.images[idx]
-        mask_path = self.masks_map[img_path.stem]
+        if self.cache is not None:
+            image_arr, mask = self.cache[idx]
+            image = Image.fromarray(np.asarray(image_arr))
+        else:
+            img_path = self.images[idx]
+            mask_path = self.masks_map[img_path.stem]
 
-        image = Image.open(img_path).convert("RGB")
-        mask = Image.open(mask_path).convert("L")
+            image = Image.open(img_path).convert("RGB")
+            mask = Image.open(mask_path).convert("L")
 
-        # Resize for training
-        image = image.resize(IMG_SIZE, Image.BILINEAR)
-        mask = mask.resize(IMG_SIZE, Image.NEAREST)
+            # Resize for training
+            image = image.resize(IMG_SIZE, Image.BILINEAR)
+            mask = mask.resize(IMG_SIZE, Image.NEAREST)
 
         mask = np.array(mask)
         mask = (mask > 128).astype(np.uint8)
@@ -171,13 +251,27 @@ train_transform = transforms.Compose([
     transforms.Normalize([0.485,0.456,0.406],[0.229,0.224,0.225])
 ])
 
-train_dataset = SeamDataset(ROOT_DIR/"train/images", ROOT_DIR/"train"/MASK_SUBDIR, transform=train_transform)
-val_dataset   = SeamDataset(ROOT_DIR/"val/images", ROOT_DIR/"val"/MASK_SUBDIR, transform=train_transform)
+def make_dataloaders(batch_size=4, cache_dir=None):
+    # Built on demand so importing this module (e.g. in mask worker processes) stays side-effect free
+    train_cache = os.path.join(cache_dir, "seam_masks_train") if cache_dir else None
+    val_cache = os.path.join(cache_dir, "seam_masks_val") if cache_dir else None
+    train_dataset = SeamDataset(ROOT_DIR/"train/images", ROOT_DIR/"train"/MASK_SUBDIR, transform=train_transform,
+                                cache_dir=train_cache)
+    val_dataset   = SeamDataset(ROOT_DIR/"val/images", ROOT_DIR/"val"/MASK_SUBDIR, transform=train_transform,
+                                cache_dir=val_cache)
 
-train_loader = DataLoader(train_dataset, batch_size=4, shuffle=True)
-val_loader   = DataLoader(val_dataset, batch_size=4, shuffle=False)
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
+    val_loader   = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
+    return train_loader, val_loader
 
 # ------------------ Run mask generation ------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate seam masks for unwelded_images")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (1 = run serially)")
+    parser.add_argument("--force", action="store_true",
+                        help="regenerate every mask, ignoring the manifest")
+    args = parser.parse_args()
+
     print("Generating masks for all images...")
-    generate_masks()
+    generate_masks(workers=args.workers, force=args.force)
@@ -0,0 +1,254 @@
+import bisect
+import itertools
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+NUM_SHARDS = 16
+
+# Log-spaced latency buckets (ms): 0.5ms .. ~4.4min (long uploads and inference
+# still get their own buckets), ~12% relative error
+LATENCY_BOUNDS_MS = [0.5 * 1.25 ** i for i in range(60)]
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def percentile_from_buckets(buckets, q):
+    """Upper bound of the bucket holding the q-th quantile ({bucket: count})."""
+    total = sum(buckets.values())
+    if total == 0:
+        return None
+    target = q * total
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen >= target:
+            if bucket < len(LATENCY_BOUNDS_MS):
+                return LATENCY_BOUNDS_MS[bucket]
+            return LATENCY_BOUNDS_MS[-1]
+    return LATENCY_BOUNDS_MS[-1]
+
+
+# ----------------------------
+# SQLite persistence
+# ----------------------------
+class MetricsStore:
+    def __init__(self, db_path="metrics.db"):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS api_calls (
+                    day TEXT,
+                    route TEXT,
+                    calls INTEGER,
+                    PRIMARY KEY (day, route)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS latency_hist (
+                    day TEXT,
+                    route TEXT,
+                    bucket INTEGER,
+                    count INTEGER,
+                    PRIMARY KEY (day, route, bucket)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS active_clients (
+                    day TEXT,
+                    client TEXT,
+                    PRIMARY KEY (day, client)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def write(self, calls, hist, clients):
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT INTO api_calls (day, route, calls) VALUES (?, ?, ?)
+                ON CONFLICT (day, route) DO UPDATE SET calls = calls + excluded.calls
+            """, [(day, route, n) for (day, route), n in calls.items()])
+            conn.executemany("""
+                INSERT INTO latency_hist (day, route, bucket, count) VALUES (?, ?, ?, ?)
+                ON CONFLICT (day, route, bucket) DO UPDATE SET count = count + excluded.count
+            """, [(day, route, bucket, n) for (day, route, bucket), n in hist.items()])
+            conn.executemany(
+                "INSERT OR IGNORE INTO active_clients (day, client) VALUES (?, ?)",
+                list(clients),
+            )
+
+    def calls_on(self, day):
+        with self._connect() as conn:
+            row = conn.execute("SELECT COALESCE(SUM(calls), 0) FROM api_calls WHERE day = ?", (day,)).fetchone()
+        return row[0]
+
+    def calls_last_days(self, days=7):
+        start = datetime.now() - timedelta(days=days - 1)
+        dates = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+        with self._connect() as conn:
+            rows = dict(conn.execute(
+                "SELECT day, SUM(calls) FROM api_calls WHERE day >= ? GROUP BY day", (dates[0],)
+            ).fetchall())
+        return [{"date": d, "calls": rows.get(d, 0)} for d in dates]
+
+    def active_clients_on(self, day, pending=()):
+        """Distinct clients stored for day, plus those in pending that aren't stored yet."""
+        pending = list(pending)
+        with self._connect() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM active_clients WHERE day = ?", (day,)).fetchone()[0]
+            known = 0
+            for i in range(0, len(pending), 500):
+                chunk = pending[i:i + 500]
+                known += conn.execute(
+                    f"SELECT COUNT(*) FROM active_clients WHERE day = ? AND client IN ({','.join('?' * len(chunk))})",
+                    (day, *chunk),
+                ).fetchone()[0]
+        return stored + len(pending) - known
+
+    def route_summary(self, day):
+        """Per-route call counts and p50/p95/p99 latency (ms) for one day."""
+        with self._connect() as conn:
+            calls = dict(conn.execute(
+                "SELECT route, calls FROM api_calls WHERE day = ?", (day,)
+            ).fetchall())
+            buckets = defaultdict(dict)
+            for route, bucket, n in conn.execute(
+                "SELECT route, bucket, count FROM latency_hist WHERE day = ?", (day,)
+            ):
+                buckets[route][bucket] = n
+
+        return {
+            route: {
+                "calls": n,
+                "p50_ms": percentile_from_buckets(buckets[route], 0.50),
+                "p95_ms": percentile_from_buckets(buckets[route], 0.95),
+                "p99_ms": percentile_from_buckets(buckets[route], 0.99),
+            }
+            for route, n in sorted(calls.items(), key=lambda kv: -kv[1])
+        }
+
+
+# ----------------------------
+# In-memory sharded counters + Flask hooks
+# ----------------------------
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = Counter()
+        self.hist = Counter()
+        self.clients = set()
+
+
+class RequestMeter:
+    """
+    Counts calls per route and day and records latency histograms. Requests
+    only touch one of NUM_SHARDS counters (assigned round-robin to each
+    thread on its first request), so workers rarely contend; a background
+    thread flushes the shards to SQLite.
+    """
+
+    def __init__(self, store, flush_interval=30, trusted_proxies=0):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.trusted_proxies = trusted_proxies  # reverse proxies (e.g. nginx) in front that set X-Forwarded-For
+        self._shards = [_Shard() for _ in range(NUM_SHARDS)]
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._next_shard = itertools.count()
+
+    def init_app(self, app):
+        from flask import g, request
+
+        @app.before_request
+        def _start_timer():
+            g._meter_start = time.perf_counter()
+
+        @app.after_request
+        def _record(response):
+            start = g.pop("_meter_start", None)
+            if start is not None:
+                route = request.url_rule.rule if request.url_rule else "<unmatched>"
+                self.record(route, (time.perf_counter() - start) * 1000, self.client_address(request))
+            return response
+
+        thread = threading.Thread(target=self._flush_loop, daemon=True)
+        thread.start()
+
+    def client_address(self, request):
+        """Client IP as seen by the outermost trusted proxy, or the socket peer without one."""
+        if self.trusted_proxies:
+            forwarded = [a.strip() for a in request.headers.get("X-Forwarded-For", "").split(",") if a.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr
+
+    def _thread_shard(self):
+        # Not get_ident() % NUM_SHARDS: idents are aligned pthread addresses,
+        # so that maps every thread to shard 0
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = self._shards[next(self._next_shard) % NUM_SHARDS]
+        return shard
+
+    def record(self, route, latency_ms, client=None):
+        day = today()
+        bucket = bisect.bisect_left(LATENCY_BOUNDS_MS, latency_ms)
+        shard = self._thread_shard()
+        with shard.lock:
+            shard.calls[(day, route)] += 1
+            shard.hist[(day, route, bucket)] += 1
+            if client:
+                shard.clients.add((day, client))
+
+    def flush(self):
+        calls, hist, clients = Counter(), Counter(), set()
+        for shard in self._shards:
+            with shard.lock:
+                calls.update(shard.calls)
+                hist.update(shard.hist)
+                clients |= shard.clients
+                shard.reset()
+        if calls:
+            with self._flush_lock:
+                self.store.write(calls, hist, clients)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Metrics flush failed: {e}")
+
+    def _pending(self, day):
+        """Calls and clients for day still in the shards (not flushed yet)."""
+        calls, clients = 0, set()
+        for shard in self._shards:
+            with shard.lock:
+                calls += sum(n for (d, _), n in shard.calls.items() if d == day)
+                clients.update(client for d, client in shard.clients if d == day)
+        return calls, clients
+
+    # /stats reads add the unflushed shards to the stored totals instead of
+    # forcing a flush, so dashboard polling never writes to SQLite
+    def calls_today(self):
+        day = today()
+        return self.store.calls_on(day) + self._pending(day)[0]
+
+    def active_users_today(self):
+        day = today()
+        return self.store.active_clients_on(day, self._pending(day)[1])
+
+    def route_summary(self, day=None):
+        self.flush()
+        return self.store.route_summary(day or today())
@@ -3,32 +3,40 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader, WeightedRandomSampler
+from torch.utils.data import WeightedRandomSampler
 from sklearn.metrics import confusion_matrix, classification_report
 import numpy as np
 
+import trainer
+from augment import BatchAugment
+
 # ----------------------------
 # 1. Paths
 # ----------------------------
 train_dir = "dataset/train/images"
 val_dir = "dataset/val/images"
 
+args = trainer.build_parser("Train a ResNet18 good/bad classifier").parse_args()
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+engine = trainer.Engine(args, device)
+
 # ----------------------------
 # 2. Transforms / Augmentations
 # ----------------------------
+# Samples stay uint8; flip, rotation and colour jitter run per batch on the device
 train_transform = transforms.Compose([
     transforms.Resize((224, 224)),
-    transforms.RandomHorizontalFlip(),
-    transforms.RandomRotation(10),
-    transforms.ColorJitter(brightness=0.2, contrast=0.2),
-    transforms.ToTensor()
+    transforms.PILToTensor()
 ])
 
 val_transform = transforms.Compose([
     transforms.Resize((224, 224)),
-    transforms.ToTensor()
+    transforms.PILToTensor()
 ])
 
+train_augment = BatchAugment(mean=None, std=None, hflip=0.5, degrees=10, brightness=0.2, contrast=0.2)
+val_augment = BatchAugment(mean=None, std=None)
+
 # ----------------------------
 # 3. Datasets
 # ----------------------------
@@ -47,17 +55,15 @@ sampler = WeightedRandomSampler(sample_weights, num_samples=len(sample_weights),
 # ----------------------------
 # 5. DataLoaders
 # ----------------------------
-train_loader = DataLoader(train_dataset, batch_size=16, sampler=sampler, num_workers=2)
-val_loader = DataLoader(val_dataset, batch_size=16, shuffle=False, num_workers=2)
+train_loader = engine.loader(train_dataset, batch_size=16, sampler=sampler)
+val_loader = engine.loader(val_dataset, batch_size=16)
 
 # ----------------------------
 # 6. Model
 # ----------------------------
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
 model = models.resnet18(pretrained=True)
 model.fc = nn.Linear(model.fc.in_features, 2)
-model = model.to(device)
+model = engine.prepare(model)
 
 # ----------------------------
 # 7. Loss & Optimizer
@@ -72,35 +78,18 @@ num_epochs = 15
 best_val_acc = 0.0
 
 for epoch in range(num_epochs):
-    model.train()
-    running_loss = 0.0
-    
-    for inputs, labels in train_loader:
-        inputs, labels = inputs.to(device), labels.to(device)
-        
-        optimizer.zero_grad()
-        outputs = model(inputs)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-        
-        running_loss += loss.item() * inputs.size(0)
-    
-    epoch_loss = running_loss / len(train_dataset)
+    epoch_loss = engine.train_epoch(model, train_loader, criterion, optimizer, batch_transform=train_augment)
     
     # ----------------------------
     # Validation
     # ----------------------------
-    model.eval()
     all_preds, all_labels = [], []
     
-    with torch.no_grad():
-        for inputs, labels in val_loader:
-            inputs, labels = inputs.to(device), labels.to(device)
-            outputs = model(inputs)
-            _, preds = torch.max(outputs, 1)
-            all_preds.extend(preds.cpu().numpy())
-            all_labels.extend(labels.cpu().numpy())
+    def collect(outputs, labels):
+        all_preds.extend(outputs.argmax(1).cpu().numpy())
+        all_labels.extend(labels.cpu().numpy())
+    
+    engine.evaluate(model, val_loader, on_batch=collect, batch_transform=val_augment)
     
     val_acc = np.mean(np.array(all_preds) == np.array(all_labels))
     print(f"Epoch {epoch+1}/{num_epochs} | Loss: {epoch_loss:.4f} | Val Acc: {val_acc:.4f}")
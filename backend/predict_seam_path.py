@@ -1,41 +1,89 @@
+import argparse
 import os
 import torch
 import torch.nn as nn
+import torch.nn.functional as nnF
 import numpy as np
-import matplotlib.pyplot as plt
 from torchvision import transforms
-from torchvision.io import read_image
-from torchvision.models.segmentation import deeplabv3_resnet50, DeepLabV3_ResNet50_Weights
+from torchvision.io import read_image, ImageReadMode
+from torchvision.models.segmentation import deeplabv3_resnet50
+
+import tiled_inference
+from augment import IMAGENET_MEAN, IMAGENET_STD
+
+MODEL_PATH = "models/seam_path_model.pth"
+IMG_SIZE = (320, 320)  # train_seam_path.py IMG_SIZE (and export_models.py SPECS["seam_path"]["size"])
 
 # --------------------------
 # Load Model
 # --------------------------
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-weights = DeepLabV3_ResNet50_Weights.DEFAULT
-model = deeplabv3_resnet50(weights=weights)
-model.classifier[4] = nn.Conv2d(256, 2, kernel_size=1)  # background + seam path
-model.load_state_dict(torch.load("models/seam_path_model.pth", map_location=device))
-model.to(device)
-model.eval()
+def load_model(checkpoint=MODEL_PATH):
+    # Same architecture as train_seam_path.py; every weight comes from the checkpoint
+    model = deeplabv3_resnet50(weights=None, weights_backbone=None, aux_loss=False)
+    model.classifier[4] = nn.Conv2d(256, 2, kernel_size=1)  # background + seam path
+    model.load_state_dict(torch.load(checkpoint, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+_model = None
+
+def get_model():
+    # Loaded on first use so importing this module stays cheap
+    global _model
+    if _model is None:
+        _model = load_model()
+    return _model
 
 # --------------------------
 # Prediction Function
 # --------------------------
-def predict_image(image_path, save_path=None):
-    transform = transforms.Compose([
-        transforms.Resize((256, 256)),
-    ])
+_MEAN = torch.tensor(IMAGENET_MEAN).view(-1, 1, 1)
+_STD = torch.tensor(IMAGENET_STD).view(-1, 1, 1)
+
+def normalize(images):
+    """uint8 RGB (N)CHW -> float, ImageNet mean/std normalized like train_seam_path.py's BatchAugment."""
+    images = images.float() / 255.0
+    return (images - _MEAN.to(images.device)) / _STD.to(images.device)
+
+def preprocess(image):
+    """uint8 RGB CHW tensor -> normalized float CHW tensor at model resolution."""
+    return normalize(transforms.Resize(IMG_SIZE, antialias=True)(image))
+
+def predict_batch(batch, model=None):
+    """Float NCHW batch -> per-pixel seam logits [N, 2, H, W]."""
+    model = model or get_model()
+    with torch.inference_mode():
+        return model(batch.to(device))["out"]
+
+def predict_mask(raw, model=None, tiled=False, tile_size=tiled_inference.TILE_SIZE,
+                 overlap=tiled_inference.TILE_OVERLAP, tile_batch=tiled_inference.TILE_BATCH):
+    """
+    uint8 RGB CHW tensor -> HxW {0,1} seam mask at the image's native size.
+    The default resizes the whole image to IMG_SIZE and upsamples the logits;
+    tiled=True runs overlapping native-resolution tiles instead, which keeps
+    thin seams on large photos.
+    """
+    if tiled:
+        logits = tiled_inference.predict_tiled(
+            raw, lambda tiles: predict_batch(normalize(tiles), model),
+            tile_size=tile_size, overlap=overlap, batch_size=tile_batch)
+    else:
+        logits = predict_batch(preprocess(raw).unsqueeze(0), model).float().cpu()
+        logits = nnF.interpolate(logits, size=raw.shape[1:], mode="bilinear", align_corners=False)[0]
+    return logits.argmax(dim=0).numpy().astype(np.uint8)
+
+def predict_image(image_path, save_path=None, **mask_opts):
+    import matplotlib.pyplot as plt
 
-    # Load & preprocess
-    image = read_image(image_path).float() / 255.0
-    orig_image = image.permute(1, 2, 0).numpy()  # HWC for plotting
-    image = transform(image).unsqueeze(0).to(device)  # add batch dim
+    # Load
+    raw = read_image(image_path, mode=ImageReadMode.RGB)
+    orig_image = (raw.float() / 255.0).permute(1, 2, 0).numpy()  # HWC for plotting
 
-    # Run inference
-    with torch.no_grad():
-        output = model(image)["out"]
-        preds = torch.argmax(output.squeeze(), dim=0).cpu().numpy()
+    # Run inference (mask comes back at the original resolution)
+    preds = predict_mask(raw, **mask_opts)
 
     # Overlay mask (red seam path)
     overlay = orig_image.copy()
@@ -64,5 +112,13 @@ def predict_image(image_path, save_path=None):
 # Example Usage
 # --------------------------
 if __name__ == "__main__":
-    test_image = "unwelded_images/val/images/example.jpg"  # change to your test file
-    predict_image(test_image, save_path="prediction_example.png")
+    parser = argparse.ArgumentParser(description="Predict the seam path on one image")
+    parser.add_argument("image", nargs="?", default="unwelded_images/val/images/example.jpg")
+    parser.add_argument("--save", default="prediction_example.png")
+    parser.add_argument("--tiled", action="store_true", help="sliding-window inference at native resolution")
+    parser.add_argument("--tile-size", type=int, default=tiled_inference.TILE_SIZE)
+    parser.add_argument("--overlap", type=float, default=tiled_inference.TILE_OVERLAP)
+    parser.add_argument("--tile-batch", type=int, default=tiled_inference.TILE_BATCH)
+    args = parser.parse_args()
+    predict_image(args.image, save_path=args.save, tiled=args.tiled, tile_size=args.tile_size,
+                  overlap=args.overlap, tile_batch=args.tile_batch)
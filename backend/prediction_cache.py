@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+PREDICTIONS_DB = os.getenv("PREDICTIONS_DB", "predictions.db")
+CACHE_DB = os.getenv("PREDICTION_CACHE_DB",
+                     os.path.join(os.path.dirname(PREDICTIONS_DB) or ".", "prediction_cache.db"))
+MEMORY_ITEMS = int(os.getenv("PREDICTION_CACHE_ITEMS", "512"))
+
+
+def content_key(data, *variant):
+    """sha256 of the image bytes, plus any options that change the result (e.g. tiled)."""
+    digest = hashlib.sha256(data).hexdigest()
+    return "|".join([digest, *map(str, variant)]) if variant else digest
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def model_key(*paths, **settings):
+    """
+    Identity of the deployed model(s): checkpoint file hashes plus settings
+    that affect outputs. Deploying a new checkpoint changes the key, so old
+    cache entries simply stop matching (and are pruned on open).
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(file_sha256(path).encode() if path and os.path.exists(path) else b"-")
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def _pack_mask(mask):
+    return zlib.compress(np.packbits(mask.astype(bool), axis=None).tobytes())
+
+
+def _unpack_mask(blob, shape):
+    bits = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+    return np.unpackbits(bits, count=int(np.prod(shape))).reshape(shape)
+
+
+class PredictionCache:
+    """
+    Results keyed by content_key() for one model_key: an in-memory LRU in
+    front of a SQLite table. A result is a JSON-able dict plus an optional
+    {0,1} mask (stored bit-packed). Each consumer (inference server, hybrid
+    pipeline, ...) uses its own namespace in the shared db; rows for other
+    model keys in that namespace are deleted when the cache is opened, so a
+    new checkpoint starts from an empty cache without touching other consumers.
+    """
+
+    def __init__(self, model_key, namespace="default", db_path=CACHE_DB, memory_items=MEMORY_ITEMS):
+        self.model_key = model_key
+        self.namespace = namespace
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(prediction_cache)")]
+        if columns and "namespace" not in columns:  # pre-namespace layout; it's only a cache
+            self._conn.execute("DROP TABLE prediction_cache")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                namespace TEXT NOT NULL,
+                content_key TEXT NOT NULL,
+                model_key TEXT NOT NULL,
+                result TEXT NOT NULL,
+                mask BLOB,
+                mask_shape TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (namespace, content_key, model_key)
+            ) WITHOUT ROWID
+        """)
+        with self._conn:
+            self._conn.execute("DELETE FROM prediction_cache WHERE namespace = ? AND model_key != ?",
+                               (namespace, model_key))
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """(result, mask or None) for key, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            row = self._conn.execute(
+                "SELECT result, mask, mask_shape FROM prediction_cache "
+                "WHERE namespace = ? AND content_key = ? AND model_key = ?",
+                (self.namespace, key, self.model_key),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            result, blob, shape = row
+            mask = _unpack_mask(blob, json.loads(shape)) if blob is not None else None
+            value = (json.loads(result), mask)
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+    def put(self, key, result, mask=None):
+        self.put_many([(key, result, mask)])
+
+    def put_many(self, items):
+        rows = []
+        with self._lock:
+            for key, result, mask in items:
+                self._remember(key, (result, mask))
+                rows.append((self.namespace, key, self.model_key, json.dumps(result),
+                             _pack_mask(mask) if mask is not None else None,
+                             json.dumps(list(mask.shape)) if mask is not None else None))
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO prediction_cache "
+                    "(namespace, content_key, model_key, result, mask, mask_shape) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM prediction_cache WHERE namespace = ?",
+                                      (self.namespace,)).fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "memory_items": len(self._memory),
+                "stored_items": size, "namespace": self.namespace, "model_key": self.model_key}
+
+    def close(self):
+        self._conn.close()
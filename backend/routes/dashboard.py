@@ -1,26 +1,24 @@
 from fastapi import APIRouter
-from datetime import datetime, timedelta
-import random
 import os
 
+from metering import MetricsStore, today
+
 router = APIRouter()
 
-# === Simulated Data ===
+METRICS_DB = os.getenv("METRICS_DB", "metrics.db")
+metrics = MetricsStore(METRICS_DB)
+
+# === Metered Data (written by the Flask RequestMeter) ===
 def get_api_calls_last_7_days():
-    today = datetime.now()
-    return [
-        {"date": (today - timedelta(days=i)).strftime("%Y-%m-%d"), "calls": random.randint(50, 200)}
-        for i in range(6, -1, -1)
-    ]
+    return metrics.calls_last_days(7)
 
 def get_recent_searches():
     return ["weld defect", "pipe crack", "good weld", "misalignment", "corrosion"]
 
 @router.get("/api/dashboard-stats")
 def get_dashboard_stats():
-    # Replace these random values with real database queries later
-    api_calls_today = random.randint(500, 1200)
-    active_users = random.randint(10, 50)
+    api_calls_today = metrics.calls_on(today())
+    active_users = metrics.active_clients_on(today())
 
     # Count total images in dataset/train/images (example)
     image_folder = os.path.join("dataset", "train", "images")
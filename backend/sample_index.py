@@ -0,0 +1,151 @@
+import os
+import threading
+
+from fiftyone import ViewField as F
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY = 11000
+
+
+def _duplicate_key_details(error):
+    """
+    BulkWriteError details when error (or the error FiftyOne re-raised it
+    from) is only duplicate-key failures, {} for a bare DuplicateKeyError,
+    else None.
+    """
+    for e in (error, error.__cause__):
+        if isinstance(e, BulkWriteError):
+            errors = e.details.get("writeErrors", [])
+            return e.details if errors and all(w.get("code") == DUPLICATE_KEY for w in errors) else None
+        if isinstance(e, DuplicateKeyError):
+            return {}
+    return None
+
+
+class SampleIndex:
+    """
+    In-process filepath -> sample id map kept in sync with a FiftyOne dataset,
+    so duplicate checks are a set lookup instead of a scan over every sample.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._lock = threading.Lock()
+
+        # FiftyOne stores absolute paths; the unique DB index catches duplicates
+        # inserted by other processes that this map can't see (see _insert)
+        dataset.create_index("filepath", unique=True)
+        ids, paths = dataset.values(["id", "filepath"])
+        self._ids = dict(zip(paths, ids))
+
+    @staticmethod
+    def key(filepath):
+        return os.path.abspath(filepath)
+
+    def __contains__(self, filepath):
+        return self.key(filepath) in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, filepath):
+        return self._ids.get(self.key(filepath))
+
+    def add(self, sample):
+        ids = self.add_many([sample])
+        return ids[0] if ids else None
+
+    def add_many(self, samples):
+        """Add the samples whose filepath is not indexed yet; returns the new ids."""
+        with self._lock:
+            new = []
+            seen = set()
+            for sample in samples:
+                key = self.key(sample.filepath)
+                if key in self._ids or key in seen:
+                    continue
+                seen.add(key)
+                new.append(sample)
+            if not new:
+                return []
+            return self._insert(new)
+
+    def _lookup(self, filepaths):
+        """{key: id} for the filepaths that exist in the dataset (as written by any process)."""
+        keys = [self.key(path) for path in filepaths]
+        if not keys:
+            return {}
+        paths, ids = self.dataset.match(F("filepath").is_in(keys)).values(["filepath", "id"])
+        return dict(zip(paths, ids))
+
+    def _insert(self, samples):
+        """
+        add_samples(), tolerating filepaths another process inserted first:
+        their ids are indexed but not returned, and samples after the
+        conflict are retried. Returns the ids this call inserted.
+        """
+        inserted = []
+        remaining = samples
+        while remaining:
+            try:
+                ids = self.dataset.add_samples(remaining)
+            except Exception as e:
+                details = _duplicate_key_details(e)
+                if details is None:
+                    raise
+            else:
+                for sample, sample_id in zip(remaining, ids):
+                    self._ids[self.key(sample.filepath)] = sample_id
+                inserted.extend(ids)
+                break
+
+            # FiftyOne inserts in batches: the ones before the failing batch went
+            # in whole (and are now backed by the dataset); inserts are ordered,
+            # so the first nInserted of the failing batch went in too
+            done = [s for s in remaining if s.in_dataset]
+            pending = [s for s in remaining if not s.in_dataset]
+            ours = pending[:details.get("nInserted", 0)]
+            rest = pending[len(ours):]
+            existing = self._lookup([s.filepath for s in ours + rest])
+            for sample in done:
+                self._ids[self.key(sample.filepath)] = sample.id
+                inserted.append(sample.id)
+            for sample in ours:
+                sample_id = existing[self.key(sample.filepath)]
+                self._ids[self.key(sample.filepath)] = sample_id
+                inserted.append(sample_id)
+
+            retry = []
+            for sample in rest:
+                key = self.key(sample.filepath)
+                if key in existing:  # written by another process
+                    self._ids[key] = existing[key]
+                else:
+                    retry.append(sample)
+            if len(retry) == len(remaining):
+                raise RuntimeError("Duplicate filepath reported, but no conflicting sample found")
+            remaining = retry
+        return inserted
+
+    def move(self, old_filepath, new_filepath, **fields):
+        """Point the sample at old_filepath to new_filepath (and set fields); returns its id, or None."""
+        with self._lock:
+            sample_id = self._ids.get(self.key(old_filepath))
+            if sample_id is None or self.key(new_filepath) in self._ids:
+                return None
+            sample = self.dataset[sample_id]
+            sample.filepath = new_filepath
+            for name, value in fields.items():
+                sample[name] = value
+            sample.save()
+            del self._ids[self.key(old_filepath)]
+            self._ids[self.key(new_filepath)] = sample_id
+            return sample_id
+
+    def remove_many(self, filepaths):
+        """Delete the samples at these filepaths; returns the removed ids."""
+        with self._lock:
+            ids = [self._ids.pop(self.key(path)) for path in filepaths if self.key(path) in self._ids]
+            if ids:
+                self.dataset.delete_samples(ids)
+            return ids
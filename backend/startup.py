@@ -0,0 +1,93 @@
+import functools
+import threading
+import time
+import traceback
+
+
+class StartupTask:
+    """
+    Runs the slow part of app startup (dataset load, folder sync, stats
+    reconcile) on a background thread so Flask binds its port immediately.
+    Steps run in registration order; status() reports the running step,
+    its progress and how long each finished step took, for /health.
+    Routes that need the dataset are wrapped with require_ready() and
+    answer 503 until every step has finished.
+    """
+
+    def __init__(self, name="startup", retry_after=5):
+        self.name = name
+        self.retry_after = retry_after
+        self._steps = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._state = {
+            "status": "starting",
+            "step": None,
+            "progress": None,
+            "completed": [],
+            "error": None,
+            "started_at": None,
+            "finished_at": None,
+        }
+
+    def step(self, label):
+        """Decorator registering the function as the next startup step."""
+        def register(fn):
+            self._steps.append((label, fn))
+            return fn
+        return register
+
+    def progress(self, done, total):
+        """Progress of the running step, e.g. folders scanned so far."""
+        with self._lock:
+            self._state["progress"] = {"done": done, "total": total}
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        with self._lock:
+            self._state["started_at"] = time.time()
+        try:
+            for label, fn in self._steps:
+                with self._lock:
+                    self._state.update(step=label, progress=None)
+                step_start = time.perf_counter()
+                fn()
+                with self._lock:
+                    self._state["completed"].append({"step": label, "seconds": round(time.perf_counter() - step_start, 2)})
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self._state.update(status="failed", error=f"{self._state['step']}: {e}", finished_at=time.time())
+            print(f"❌ Startup failed during {self._state['step']}: {e}")
+            return
+
+        with self._lock:
+            self._state.update(status="ready", step=None, progress=None, finished_at=time.time())
+            elapsed = self._state["finished_at"] - self._state["started_at"]
+        self._ready.set()
+        print(f"✅ Startup finished in {elapsed:.1f}s")
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        with self._lock:
+            return dict(self._state, completed=list(self._state["completed"]))
+
+    def require_ready(self, view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if not self.ready:
+                status = self.status()
+                message = "Startup failed" if status["status"] == "failed" else "Dataset is still loading, retry later"
+                return {"error": message, "startup": status}, 503, {"Retry-After": str(self.retry_after)}
+            return view(*args, **kwargs)
+        return wrapped
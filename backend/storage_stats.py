@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+LABELS = ("good", "bad", "unlabeled")
+RECENT_UPLOADS = 10
+
+
+class StorageStats:
+    """
+    Running totals (sample count, bytes on disk, per-label counts) persisted
+    to stats.json, so /stats never has to stat every file in the dataset.
+    Keys this class doesn't own are left untouched in the file.
+    """
+
+    def __init__(self, path="stats.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        self._pending = []  # one Counter per running reconcile(): changes made during its scan
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        self._data.setdefault("count", 0)
+        self._data.setdefault("storage_bytes", 0)
+        self._data.setdefault("recent_uploads", [])
+        for label in LABELS:
+            self._data.setdefault(label, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._data))
+
+    def is_stale(self, dataset):
+        return self._data["count"] != len(dataset)
+
+    def _add(self, key, amount):
+        """Adjust one total (caller holds the lock), also noting it for running reconciles."""
+        self._data[key] = max(0, self._data.get(key, 0) + amount)
+        for deltas in self._pending:
+            deltas[key] += amount
+
+    def record(self, filepath, label, upload=False, name=None):
+        self.record_many([(filepath, label)], upload=upload, names=[name] if name else None)
+
+    def record_many(self, items, upload=False, names=None):
+        """
+        Add (filepath, label) pairs for samples that were just inserted.
+        names overrides what recent_uploads shows (e.g. the original filename
+        of a content-addressed upload).
+        """
+        sizes = [(os.path.getsize(path) if os.path.exists(path) else 0, path, label)
+                 for path, label in items]
+        if not sizes:
+            return
+        names = names or [os.path.basename(path) for _, path, _ in sizes]
+        with self._lock:
+            for (size, path, label), name in zip(sizes, names):
+                self._add("count", 1)
+                self._add("storage_bytes", size)
+                self._add(label, 1)
+                if upload:
+                    recent = self._data["recent_uploads"]
+                    recent.append(name)
+                    del recent[:-RECENT_UPLOADS]
+            self._save()
+
+    def remove_many(self, items):
+        """Subtract (size in bytes, label) pairs for samples that were just deleted."""
+        if not items:
+            return
+        with self._lock:
+            for size, label in items:
+                self._add("count", -1)
+                self._add("storage_bytes", -size)
+                self._add(label, -1)
+            self._save()
+
+    def relabel(self, old_label, new_label, count=1):
+        if old_label == new_label or count <= 0:
+            return
+        with self._lock:
+            self._add(old_label, -count)
+            self._add(new_label, count)
+            self._save()
+
+    def reconcile(self, dataset):
+        """
+        Recompute every total from the dataset and the filesystem. The scan
+        runs without the lock (so snapshot() never waits on it); changes
+        recorded meanwhile are collected and applied on top of the new totals.
+        """
+        deltas = Counter()
+        with self._lock:
+            self._pending.append(deltas)
+        try:
+            paths, labels = dataset.values(["filepath", "ground_truth.label"])
+            totals = Counter({label: 0 for label in LABELS})
+            totals["count"] = len(paths)
+            totals["storage_bytes"] = 0
+            for path, label in zip(paths, labels):
+                if os.path.exists(path):
+                    totals["storage_bytes"] += os.path.getsize(path)
+                totals[label or "unlabeled"] += 1
+        except Exception:
+            with self._lock:
+                self._pending.remove(deltas)
+            raise
+
+        with self._lock:
+            self._pending.remove(deltas)
+            for key, value in totals.items():
+                self._data[key] = max(0, value + deltas[key])
+            self._save()
+
+    def start_reconciler(self, dataset, interval):
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reconcile(dataset)
+                except Exception as e:
+                    print(f"⚠️ Stats reconciliation failed: {e}")
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
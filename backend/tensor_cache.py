@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+INDEX_NAME = "index.json"
+SHARD_SIZE = 512
+
+
+def _fingerprint(pairs, size, image_resample, mask_resample):
+    h = hashlib.sha256(json.dumps([list(size), image_resample, mask_resample]).encode())
+    for img_path, mask_path in pairs:
+        for path in (img_path, mask_path):
+            st = os.stat(path)
+            h.update(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}\n".encode())
+    return h.hexdigest()
+
+
+def _decode(pair, size, image_resample, mask_resample):
+    img_path, mask_path = pair
+    with Image.open(img_path) as img:
+        image = np.asarray(img.convert("RGB").resize(size, image_resample))
+    with Image.open(mask_path) as m:
+        mask = np.asarray(m.convert("L").resize(size, mask_resample))
+    return image, mask
+
+
+def build_cache(pairs, cache_dir, size, image_resample=Image.BILINEAR,
+                mask_resample=Image.NEAREST, shard_size=SHARD_SIZE, workers=None):
+    """
+    Decode and resize every (image, mask) pair once into uint8 .npy shards
+    (images [N,H,W,3], masks [N,H,W] grayscale, not thresholded) plus an
+    index.json. size is (width, height) like PIL's resize().
+    """
+    pairs = [(str(i), str(m)) for i, m in pairs]
+    size = tuple(size)
+    os.makedirs(cache_dir, exist_ok=True)
+    w, h = size
+
+    shards = []
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        for start in range(0, len(pairs), shard_size):
+            chunk = pairs[start:start + shard_size]
+            n = len(shards)
+            img_name, mask_name = f"images_{n:03d}.npy", f"masks_{n:03d}.npy"
+            images = np.lib.format.open_memmap(os.path.join(cache_dir, img_name), mode="w+",
+                                               dtype=np.uint8, shape=(len(chunk), h, w, 3))
+            masks = np.lib.format.open_memmap(os.path.join(cache_dir, mask_name), mode="w+",
+                                              dtype=np.uint8, shape=(len(chunk), h, w))
+            decoded = pool.map(lambda p: _decode(p, size, image_resample, mask_resample), chunk)
+            for i, (image, mask) in enumerate(decoded):
+                images[i] = image
+                masks[i] = mask
+            images.flush()
+            masks.flush()
+            del images, masks
+            shards.append({"images": img_name, "masks": mask_name, "count": len(chunk)})
+
+    index = {
+        "fingerprint": _fingerprint(pairs, size, image_resample, mask_resample),
+        "size": list(size),
+        "image_resample": image_resample,
+        "mask_resample": mask_resample,
+        "count": len(pairs),
+        "shards": shards,
+        "pairs": pairs,
+    }
+    tmp = os.path.join(cache_dir, INDEX_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(cache_dir, INDEX_NAME))
+    return TensorCache(cache_dir)
+
+
+class TensorCache:
+    """
+    Read side of build_cache(): cache[i] -> (image HxWx3, mask HxW) uint8
+    views straight into memory-mapped shards. Only the directory is pickled,
+    so DataLoader workers reopen the maps and share the page cache.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, INDEX_NAME)) as f:
+            self.index = json.load(f)
+        self._locations = [(s, i) for s, shard in enumerate(self.index["shards"])
+                           for i in range(shard["count"])]
+        self._maps = None
+
+    def __getstate__(self):
+        return {"cache_dir": self.cache_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state["cache_dir"])
+
+    def _open(self):
+        self._maps = [
+            (np.load(os.path.join(self.cache_dir, s["images"]), mmap_mode="r"),
+             np.load(os.path.join(self.cache_dir, s["masks"]), mmap_mode="r"))
+            for s in self.index["shards"]
+        ]
+
+    def __len__(self):
+        return self.index["count"]
+
+    def __getitem__(self, idx):
+        if self._maps is None:
+            self._open()
+        shard, offset = self._locations[idx]
+        images, masks = self._maps[shard]
+        return images[offset], masks[offset]
+
+    @property
+    def pairs(self):
+        return [tuple(p) for p in self.index["pairs"]]
+
+
+def open_or_build(pairs, cache_dir, size, image_resample=Image.BILINEAR,
+                  mask_resample=Image.NEAREST, **kwargs):
+    """Reuse the cache in cache_dir if it was built from the same files and settings."""
+    pairs = [(str(i), str(m)) for i, m in pairs]
+    index_path = os.path.join(cache_dir, INDEX_NAME)
+    if os.path.exists(index_path):
+        cache = TensorCache(cache_dir)
+        if cache.index["fingerprint"] == _fingerprint(pairs, tuple(size), image_resample, mask_resample):
+            return cache
+    print(f"[TensorCache] Building {cache_dir} from {len(pairs)} pairs at {tuple(size)}...")
+    return build_cache(pairs, cache_dir, size, image_resample, mask_resample, **kwargs)
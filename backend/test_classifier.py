@@ -3,9 +3,12 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torchvision import datasets, models, transforms
-from torch.utils.data import DataLoader, WeightedRandomSampler
+from torch.utils.data import WeightedRandomSampler
 from collections import Counter
-import copy
+import trainer
+import checkpointing
+from checkpointing import CheckpointManager
+from augment import BatchAugment
 
 # ----------------------------
 # CONFIG
@@ -17,23 +20,29 @@ LR = 1e-4
 EARLY_STOPPING_PATIENCE = 5
 DATA_DIR = "dataset"  # expects train/images/{good,bad} and val/images/{good,bad}
 
+parser = trainer.build_parser("Train the ResNet18 good/bad weld classifier")
+checkpointing.add_arguments(parser, "checkpoints/classifier")
+args = parser.parse_args()
+engine = trainer.Engine(args, DEVICE)
+
 # ----------------------------
 # TRANSFORMS
 # ----------------------------
+# Samples stay uint8; flips, rotation and colour jitter run per batch on the device
 train_transforms = transforms.Compose([
     transforms.Resize((224, 224)),
-    transforms.RandomHorizontalFlip(),
-    transforms.RandomVerticalFlip(),
-    transforms.RandomRotation(20),
-    transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2),
-    transforms.ToTensor(),
+    transforms.PILToTensor(),
 ])
 
 val_transforms = transforms.Compose([
     transforms.Resize((224, 224)),
-    transforms.ToTensor(),
+    transforms.PILToTensor(),
 ])
 
+train_augment = BatchAugment(mean=None, std=None, hflip=0.5, vflip=0.5, degrees=20,
+                             brightness=0.2, contrast=0.2, saturation=0.2)
+val_augment = BatchAugment(mean=None, std=None)
+
 # ----------------------------
 # DATASETS
 # ----------------------------
@@ -48,8 +57,8 @@ print("Class counts:", class_counts)
 class_weights = [1.0 / class_counts[label] for _, label in train_dataset.samples]
 train_sampler = WeightedRandomSampler(weights=class_weights, num_samples=len(class_weights), replacement=True)
 
-train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, sampler=train_sampler)
-val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE, shuffle=False)
+train_loader = engine.loader(train_dataset, BATCH_SIZE, sampler=train_sampler)
+val_loader = engine.loader(val_dataset, BATCH_SIZE)
 
 # ----------------------------
 # MODEL
@@ -60,7 +69,7 @@ model.fc = nn.Sequential(
     nn.Dropout(0.3),
     nn.Linear(num_ftrs, 2)
 )
-model = model.to(DEVICE)
+model = engine.prepare(model)
 
 # ----------------------------
 # LOSS & OPTIMIZER
@@ -74,55 +83,43 @@ scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', factor=0
 # ----------------------------
 # TRAINING LOOP WITH EARLY STOPPING
 # ----------------------------
+# Best weights live in the checkpoint directory instead of an in-memory deepcopy
+ckpt = CheckpointManager(args.checkpoint_dir, keep_best=args.keep_best, every=args.checkpoint_every,
+                         resume=bool(args.resume))
 best_val_acc = 0
-best_model_wts = copy.deepcopy(model.state_dict())
 early_stop_counter = 0
-
-for epoch in range(EPOCHS):
-    model.train()
-    running_loss, correct, total = 0, 0, 0
+start_epoch = 0
+if args.resume:
+    start_epoch, extra = ckpt.resume(model, optimizer, scheduler, path=args.resume)
+    best_val_acc = extra.get("best_val_acc", best_val_acc)
+    early_stop_counter = extra.get("early_stop_counter", early_stop_counter)
+
+def accuracy_counter(correct, total):
+    """on_batch callback tallying per-class correct/total predictions."""
+    def update(outputs, labels):
+        preds = outputs.argmax(1)
+        for label, pred in zip(labels.tolist(), preds.tolist()):
+            correct[label] += int(pred == label)
+            total[label] += 1
+    return update
+
+for epoch in range(start_epoch, EPOCHS):
     per_class_correct = Counter()
     per_class_total = Counter()
-
-    for imgs, labels in train_loader:
-        imgs, labels = imgs.to(DEVICE), labels.to(DEVICE)
-        optimizer.zero_grad()
-        outputs = model(imgs)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-
-        running_loss += loss.item() * imgs.size(0)
-        _, preds = torch.max(outputs, 1)
-        correct += (preds == labels).sum().item()
-        total += labels.size(0)
-
-        for label, pred in zip(labels, preds):
-            per_class_correct[label.item()] += (pred == label).item()
-            per_class_total[label.item()] += 1
-
-    train_loss = running_loss / total
-    train_acc = correct / total
-    per_class_acc = {cls: per_class_correct[cls]/per_class_total[cls] for cls in per_class_correct}
+    train_loss = engine.train_epoch(model, train_loader, criterion, optimizer,
+                                    on_batch=accuracy_counter(per_class_correct, per_class_total),
+                                    batch_transform=train_augment)
+    train_acc = sum(per_class_correct.values()) / sum(per_class_total.values())
+    per_class_acc = {cls: per_class_correct[cls]/per_class_total[cls] for cls in per_class_total}
 
     # Validation
-    model.eval()
-    val_correct, val_total = 0, 0
     val_per_class_correct = Counter()
     val_per_class_total = Counter()
-    with torch.no_grad():
-        for imgs, labels in val_loader:
-            imgs, labels = imgs.to(DEVICE), labels.to(DEVICE)
-            outputs = model(imgs)
-            _, preds = torch.max(outputs, 1)
-            val_correct += (preds == labels).sum().item()
-            val_total += labels.size(0)
-            for label, pred in zip(labels, preds):
-                val_per_class_correct[label.item()] += (pred == label).item()
-                val_per_class_total[label.item()] += 1
-
-    val_acc = val_correct / val_total
-    val_per_class_acc = {cls: val_per_class_correct[cls]/val_per_class_total[cls] for cls in val_per_class_correct}
+    engine.evaluate(model, val_loader, on_batch=accuracy_counter(val_per_class_correct, val_per_class_total),
+                    batch_transform=val_augment)
+
+    val_acc = sum(val_per_class_correct.values()) / sum(val_per_class_total.values())
+    val_per_class_acc = {cls: val_per_class_correct[cls]/val_per_class_total[cls] for cls in val_per_class_total}
 
     print(f"Epoch {epoch+1}/{EPOCHS} - Loss: {train_loss:.4f}, Train Acc: {train_acc:.4f}, Per-class: {per_class_acc}")
     print(f"Validation Acc: {val_acc:.4f}, Per-class: {val_per_class_acc}")
@@ -131,17 +128,21 @@ for epoch in range(EPOCHS):
 
     if val_acc > best_val_acc:
         best_val_acc = val_acc
-        best_model_wts = copy.deepcopy(model.state_dict())
-        torch.save(model.state_dict(), "classifier_resnet18_best.pth")
-        print("✅ Saved new best model")
+        print("✅ New best model")
         early_stop_counter = 0
     else:
         early_stop_counter += 1
-        if early_stop_counter >= EARLY_STOPPING_PATIENCE:
-            print("⏹ Early stopping triggered")
-            break
 
-model.load_state_dict(best_model_wts)
+    stop = early_stop_counter >= EARLY_STOPPING_PATIENCE
+    ckpt.save(epoch + 1, model, optimizer, scheduler, metric=val_acc, force=stop or epoch + 1 == EPOCHS,
+              extra={"best_val_acc": best_val_acc, "early_stop_counter": early_stop_counter})
+    if stop:
+        print("⏹ Early stopping triggered")
+        break
+
+ckpt.close()
+ckpt.load_best(model)
+torch.save(model.state_dict(), "classifier_resnet18_best.pth")
 torch.save(model.state_dict(), "classifier_resnet18_final.pth")
 print(f"Training complete. Best Validation Acc: {best_val_acc:.4f}")
 print("✅ Final model saved as classifier_resnet18_final.pth")
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Neighbour bit order, clockwise from north (OpenCV/Zhang-Suen naming):
+#   p9 p2 p3
+#   p8 p1 p4
+#   p7 p6 p5
+# p2 -> bit 0, p3 -> bit 1, ..., p9 -> bit 7
+_OFFSETS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+
+def _build_luts():
+    """Deletable-pixel tables for the two Zhang-Suen sub-iterations, indexed by neighbour code."""
+    luts = np.zeros((2, 256), dtype=bool)
+    for code in range(256):
+        p = [(code >> i) & 1 for i in range(8)]
+        p2, p3, p4, p5, p6, p7, p8, p9 = p
+        a = sum(1 for i in range(8) if p[i] == 0 and p[(i + 1) % 8] == 1)
+        b = sum(p)
+        if a != 1 or not 2 <= b <= 6:
+            continue
+        luts[0, code] = p2 * p4 * p6 == 0 and p4 * p6 * p8 == 0
+        luts[1, code] = p2 * p4 * p8 == 0 and p2 * p6 * p8 == 0
+    return luts
+
+
+_LUTS = _build_luts()
+
+
+def _neighbour_codes(img):
+    h, w = img.shape
+    code = np.zeros((h - 2, w - 2), dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(_OFFSETS):
+        code |= img[1 + dy:h - 1 + dy, 1 + dx:w - 1 + dx] << bit
+    return code
+
+
+def zhang_suen_thinning(mask):
+    """
+    Zhang-Suen thinning of a uint8 mask (0/255), pixel-identical to
+    cv2.ximgproc.thinning(mask, THINNING_ZHANGSUEN): pixels >= 128 are
+    foreground and the one-pixel image border is never modified.
+
+    Each sub-iteration is a handful of whole-array NumPy ops: build every
+    pixel's 8-neighbour code, look up deletability in a 256-entry table.
+    """
+    img = (np.asarray(mask) >= 128).astype(np.uint8)
+    if img.ndim != 2 or min(img.shape) < 3:
+        return img * 255
+
+    # Only the bounding box of the foreground (plus a 1px ring) can change
+    rows = np.flatnonzero(img.any(axis=1))
+    cols = np.flatnonzero(img.any(axis=0))
+    if rows.size == 0:
+        return img * 255
+    y0, y1 = max(rows[0] - 1, 0), min(rows[-1] + 2, img.shape[0])
+    x0, x1 = max(cols[0] - 1, 0), min(cols[-1] + 2, img.shape[1])
+    work = img[y0:y1, x0:x1]
+    if min(work.shape) < 3:
+        return img * 255
+
+    inner = work[1:-1, 1:-1]  # view: writes land in img
+    changed = True
+    while changed:
+        changed = False
+        for lut in _LUTS:
+            remove = lut[_neighbour_codes(work)] & (inner == 1)
+            if remove.any():
+                inner[remove] = 0
+                changed = True
+    return img * 255
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+
+from PIL import Image, ImageOps
+
+THUMB_SIZES = (128, 256, 512, 1024)
+THUMB_FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+
+
+class ThumbnailCache:
+    """
+    Resized variants of dataset images stored on disk under
+    <cache_dir>/<content hash[:2]>/<content hash>_<size>.<fmt>, evicted
+    least-recently-used once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir="thumb_cache", max_bytes=512 * 1024 * 1024, quality=80):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._hashes = {}  # (path, mtime, size) -> sha256, avoids rehashing originals
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total = sum(os.path.getsize(p) for p in self._cached_files())
+
+    def _cached_files(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for f in files:
+                if not f.endswith(".tmp"):
+                    yield os.path.join(root, f)
+
+    def content_hash(self, path):
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        digest = self._hashes.get(key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._hashes[key] = digest
+        return digest
+
+    def variant_path(self, digest, size, fmt):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}_{size}.{fmt}")
+
+    def get(self, path, size, fmt="webp"):
+        """Return the cached variant path for path, building it if needed."""
+        out_path = self.variant_path(self.content_hash(path), size, fmt)
+        if os.path.exists(out_path):
+            os.utime(out_path)  # mark as recently used
+            return out_path
+        self._render(path, out_path, size, fmt)
+        return out_path
+
+    def pregenerate(self, path, sizes=(256,), formats=("webp", "jpeg")):
+        for size in sizes:
+            for fmt in formats:
+                self.get(path, size, fmt)
+
+    def _render(self, path, out_path, size, fmt):
+        with Image.open(path) as img:
+            # JPEG decodes straight to a reduced scale (1/2, 1/4, 1/8)
+            img.draft("RGB", (size, size))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            img.thumbnail((size, size), Image.LANCZOS, reducing_gap=2.0)
+
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, THUMB_FORMATS[fmt][0], quality=self.quality)
+        os.replace(tmp_path, out_path)
+
+        with self._lock:
+            self._total += os.path.getsize(out_path)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Oldest access first, down to 90% of the cap
+        files = sorted(self._cached_files(), key=os.path.getmtime)
+        target = self.max_bytes * 0.9
+        for f in files:
+            if self._total <= target:
+                break
+            try:
+                size = os.path.getsize(f)
+                os.remove(f)
+                self._total -= size
+            except OSError:
+                pass
+
+
+def pick_format(accept_header):
+    return "webp" if "image/webp" in (accept_header or "") else "jpeg"
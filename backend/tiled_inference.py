@@ -0,0 +1,91 @@
+import torch
+import torch.nn.functional as F
+
+TILE_SIZE = 512
+TILE_OVERLAP = 0.25
+TILE_BATCH = 8
+
+
+def blend_window(size, kind="gaussian", device=None):
+    """
+    [H, W] weights that peak at the tile centre and fall off towards the
+    edges, so overlapping tiles hand over smoothly instead of seaming.
+    Each axis is floored at 1e-3 (rather than the product) so pixels near
+    the image border, covered only by tile edges along one axis, still keep
+    the falloff along the other.
+    """
+    h, w = size
+
+    def profile(n):
+        x = torch.linspace(-1, 1, n, device=device)
+        if kind == "gaussian":
+            p = torch.exp(-0.5 * (x / 0.25) ** 2)  # sigma = 1/8 of the tile, as nnU-Net
+        elif kind == "linear":
+            p = 1 - x.abs()
+        else:
+            raise ValueError(f"Unknown blend window: {kind}")
+        return p.clamp_(min=1e-3)
+
+    return profile(h)[:, None] * profile(w)[None, :]
+
+
+def tile_starts(length, tile, stride):
+    """Tile offsets covering [0, length); the last tile is aligned to the end."""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def _tiles(image, tile, stride):
+    """Yield (y, x, tile) crops, padding bottom/right when the image is smaller than a tile."""
+    _, h, w = image.shape
+    pad_h, pad_w = max(0, tile - h), max(0, tile - w)
+    if pad_h or pad_w:
+        image = F.pad(image, (0, pad_w, 0, pad_h))
+    for y in tile_starts(h, tile, stride):
+        for x in tile_starts(w, tile, stride):
+            yield y, x, image[:, y:y + tile, x:x + tile]
+
+
+def predict_tiled(image, predict_fn, tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                  batch_size=TILE_BATCH, window="gaussian"):
+    """
+    Sliding-window inference over a full-resolution CHW image (uint8 is
+    fine; it is handed to predict_fn unchanged). predict_fn maps a [B, C,
+    tile, tile] batch of crops to [B, K, h, w] logits; outputs at another
+    resolution are resized back to the tile. Tiles are cut and batched
+    lazily, so only batch_size crops exist at a time, and their logits are
+    accumulated with the blend window into a [K, H, W] float32 canvas.
+    Returns the blended logits at the image's native resolution (CPU).
+    """
+    _, h, w = image.shape
+    stride = max(1, int(tile_size * (1 - overlap)))
+    weight = blend_window((tile_size, tile_size), window)
+
+    logits_sum = None
+    weight_sum = torch.zeros(h + max(0, tile_size - h), w + max(0, tile_size - w))
+
+    def flush(coords, crops):
+        nonlocal logits_sum
+        out = predict_fn(torch.stack(crops)).float().cpu()
+        if out.shape[-2:] != (tile_size, tile_size):
+            out = F.interpolate(out, size=(tile_size, tile_size), mode="bilinear", align_corners=False)
+        if logits_sum is None:
+            logits_sum = torch.zeros(out.shape[1], *weight_sum.shape)
+        for (y, x), tile_logits in zip(coords, out):
+            logits_sum[:, y:y + tile_size, x:x + tile_size] += tile_logits * weight
+            weight_sum[y:y + tile_size, x:x + tile_size] += weight
+
+    coords, crops = [], []
+    for y, x, crop in _tiles(image, tile_size, stride):
+        coords.append((y, x))
+        crops.append(crop)
+        if len(crops) == batch_size:
+            flush(coords, crops)
+            coords, crops = [], []
+    if crops:
+        flush(coords, crops)
+
+    return logits_sum.div_(weight_sum)[:, :h, :w]
@@ -1,17 +1,23 @@
 import os
+import numpy as np
 from PIL import Image
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset
 from torchvision import transforms, models
-from tqdm import tqdm
+
+from tensor_cache import open_or_build
+import trainer
+import checkpointing
+from checkpointing import CheckpointManager
 
 # --------------------
 # Dataset Class
 # --------------------
 class SegmentationDataset(Dataset):
-    def __init__(self, img_dir, mask_dir, transform_img=None, transform_mask=None):
+    def __init__(self, img_dir, mask_dir, transform_img=None, transform_mask=None,
+                 cache_dir=None, cache_size=(256, 256)):
         self.img_dir = img_dir
         self.mask_dir = mask_dir
         self.transform_img = transform_img
@@ -46,13 +52,23 @@ class SegmentationDataset(Dataset):
         if len(self.pairs) > 0:
             print("Example pair:", self.pairs[0])
 
+        # Optional pre-resized uint8 copies in memory-mapped shards (see tensor_cache.py);
+        # masks are resized bilinearly like transforms.Resize does
+        self.cache = None
+        if cache_dir:
+            self.cache = open_or_build(self.pairs, cache_dir, cache_size, mask_resample=Image.BILINEAR)
+
     def __len__(self):
         return len(self.pairs)
 
     def __getitem__(self, idx):
-        img_path, mask_path = self.pairs[idx]
-        image = Image.open(img_path).convert("RGB")
-        mask = Image.open(mask_path).convert("L")  # grayscale
+        if self.cache is not None:
+            image_arr, mask_arr = self.cache[idx]
+            image, mask = Image.fromarray(np.asarray(image_arr)), Image.fromarray(np.asarray(mask_arr))
+        else:
+            img_path, mask_path = self.pairs[idx]
+            image = Image.open(img_path).convert("RGB")
+            mask = Image.open(mask_path).convert("L")  # grayscale
 
         if self.transform_img:
             image = self.transform_img(image)
@@ -70,6 +86,7 @@ train_img_dir = "dataset/train/images"
 train_mask_dir = "dataset/train/masks"
 val_img_dir = "dataset/val/images"
 val_mask_dir = "dataset/val/masks"
+tensor_cache_dir = os.getenv("TENSOR_CACHE_DIR")  # set to decode+resize once into mmap shards
 
 # --------------------
 # Transforms
@@ -84,22 +101,33 @@ transform_mask = transforms.Compose([
     transforms.ToTensor(),
 ])
 
+# --------------------
+# Options & Engine
+# --------------------
+parser = trainer.build_parser("Train DeepLabV3 on dataset/ seam masks")
+checkpointing.add_arguments(parser, "checkpoints/deeplab")
+args = parser.parse_args()
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+engine = trainer.Engine(args, device)
+
 # --------------------
 # Datasets & Loaders
 # --------------------
-train_dataset = SegmentationDataset(train_img_dir, train_mask_dir, transform_img, transform_mask)
-val_dataset = SegmentationDataset(val_img_dir, val_mask_dir, transform_img, transform_mask)
+with engine.main_first():  # rank 0 builds the tensor caches, the others reuse them
+    train_dataset = SegmentationDataset(train_img_dir, train_mask_dir, transform_img, transform_mask,
+                                        cache_dir=tensor_cache_dir and os.path.join(tensor_cache_dir, "deeplab_train"))
+    val_dataset = SegmentationDataset(val_img_dir, val_mask_dir, transform_img, transform_mask,
+                                      cache_dir=tensor_cache_dir and os.path.join(tensor_cache_dir, "deeplab_val"))
 
-train_loader = DataLoader(train_dataset, batch_size=4, shuffle=True)
-val_loader = DataLoader(val_dataset, batch_size=4)
+train_loader = engine.loader(train_dataset, batch_size=4, shuffle=True)
+val_loader = engine.loader(val_dataset, batch_size=4)
 
 # --------------------
 # Model (DeeplabV3)
 # --------------------
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 model = models.segmentation.deeplabv3_resnet50(pretrained=True)
 model.classifier[4] = nn.Conv2d(256, 2, kernel_size=1)  # binary classes
-model = model.to(device)
+model = engine.prepare(model, find_unused_parameters=True)  # aux head isn't in the loss
 
 # --------------------
 # Loss & Optimizer
@@ -107,35 +135,38 @@ model = model.to(device)
 criterion = nn.CrossEntropyLoss()
 optimizer = optim.Adam(model.parameters(), lr=1e-4)
 
+# --------------------
+# Checkpointing
+# --------------------
+ckpt = CheckpointManager(args.checkpoint_dir, keep_best=args.keep_best, every=args.checkpoint_every,
+                         enabled=engine.is_main, resume=bool(args.resume))
+start_epoch = 0
+if args.resume:
+    start_epoch, _ = ckpt.resume(model, optimizer, path=args.resume)
+    engine.epoch = start_epoch
+
 # --------------------
 # Training Loop
 # --------------------
 num_epochs = 10
-for epoch in range(num_epochs):
-    model.train()
-    running_loss = 0.0
-    for images, masks in tqdm(train_loader, desc=f"Epoch {epoch+1}/{num_epochs}"):
-        images, masks = images.to(device), masks.to(device)
-
-        optimizer.zero_grad()
-        outputs = model(images)["out"]
-        loss = criterion(outputs, masks)
-        loss.backward()
-        optimizer.step()
-        running_loss += loss.item()
-
-    print(f"Epoch {epoch+1} - Loss: {running_loss/len(train_loader):.4f}")
+for epoch in range(start_epoch, num_epochs):
+    train_loss = engine.train_epoch(model, train_loader, criterion, optimizer, output_key="out",
+                                    desc=f"Epoch {epoch+1}/{num_epochs}")
 
     # Validation
-    model.eval()
-    val_loss = 0.0
-    with torch.no_grad():
-        for images, masks in val_loader:
-            images, masks = images.to(device), masks.to(device)
-            outputs = model(images)["out"]
-            loss = criterion(outputs, masks)
-            val_loss += loss.item()
-    print(f"Validation Loss: {val_loss/len(val_loader):.4f}")
-
-torch.save(model.state_dict(), "deeplab_seam.pth")
-print("✅ Training complete. Model saved to deeplab_seam.pth")
+    dice = trainer.DiceMeter()
+    val_loss = engine.evaluate(model, val_loader, criterion, output_key="out", on_batch=dice)
+    val_dice = dice.compute(engine)
+    if engine.is_main:
+        print(f"Epoch {epoch+1} - Loss: {train_loss:.4f}")
+        print(f"Validation Loss: {val_loss:.4f} | Dice: {val_dice:.4f}")
+
+    ckpt.save(epoch + 1, model, optimizer, metric=val_dice, force=epoch + 1 == num_epochs)
+
+ckpt.close()
+engine.save(model, "deeplab_seam.pth")
+if engine.is_main:
+    print("✅ Training complete. Model saved to deeplab_seam.pth")
+    if ckpt.best_path:
+        print(f"Best Val Dice {ckpt.best_metric:.4f}: {ckpt.best_path}")
+engine.close()
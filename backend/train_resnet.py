@@ -2,15 +2,18 @@ import os
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
 from torchvision import datasets, transforms, models
 
+import trainer
+
 # -------- Config --------
 data_dir = "dataset"  # should have subfolders "Good" and "Defect"
 batch_size = 16
 num_epochs = 10
 lr = 0.001
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+args = trainer.build_parser("Train a ResNet18 good/defect classifier").parse_args()
+engine = trainer.Engine(args, device)
 
 # -------- Data --------
 transform = transforms.Compose([
@@ -21,51 +24,37 @@ transform = transforms.Compose([
 train_dataset = datasets.ImageFolder(os.path.join(data_dir, "train"), transform=transform)
 val_dataset   = datasets.ImageFolder(os.path.join(data_dir, "val"), transform=transform)
 
-train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-val_loader   = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
+train_loader = engine.loader(train_dataset, batch_size, shuffle=True)
+val_loader   = engine.loader(val_dataset, batch_size)
 
 # -------- Model --------
 model = models.resnet18(pretrained=True)  # start with pretrained weights
 model.fc = nn.Linear(model.fc.in_features, 2)  # binary classification
-model = model.to(device)
+model = engine.prepare(model)
 
 criterion = nn.CrossEntropyLoss()
 optimizer = optim.Adam(model.parameters(), lr=lr)
 
 # -------- Training Loop --------
-for epoch in range(num_epochs):
-    model.train()
-    running_loss, correct, total = 0.0, 0, 0
-
-    for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)
+def accuracy_counter(counts):
+    """on_batch callback accumulating [correct, total]."""
+    def update(outputs, labels):
+        counts[0] += (outputs.argmax(1) == labels).sum().item()
+        counts[1] += labels.size(0)
+    return update
 
-        optimizer.zero_grad()
-        outputs = model(images)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-
-        running_loss += loss.item()
-        _, predicted = torch.max(outputs, 1)
-        correct += (predicted == labels).sum().item()
-        total += labels.size(0)
-
-    train_acc = 100 * correct / total
-    print(f"Epoch [{epoch+1}/{num_epochs}] Loss: {running_loss/len(train_loader):.4f} Acc: {train_acc:.2f}%")
+for epoch in range(num_epochs):
+    train_counts = [0, 0]
+    train_loss = engine.train_epoch(model, train_loader, criterion, optimizer,
+                                    on_batch=accuracy_counter(train_counts))
+    train_acc = 100 * train_counts[0] / train_counts[1]
+    print(f"Epoch [{epoch+1}/{num_epochs}] Loss: {train_loss:.4f} Acc: {train_acc:.2f}%")
 
     # Validation
-    model.eval()
-    correct, total = 0, 0
-    with torch.no_grad():
-        for images, labels in val_loader:
-            images, labels = images.to(device), labels.to(device)
-            outputs = model(images)
-            _, predicted = torch.max(outputs, 1)
-            correct += (predicted == labels).sum().item()
-            total += labels.size(0)
+    val_counts = [0, 0]
+    engine.evaluate(model, val_loader, on_batch=accuracy_counter(val_counts))
 
-    val_acc = 100 * correct / total
+    val_acc = 100 * val_counts[0] / val_counts[1]
     print(f"Validation Accuracy: {val_acc:.2f}%")
 
 # -------- Save --------
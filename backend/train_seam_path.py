@@ -1,12 +1,16 @@
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
-from torchvision import transforms, models
-from torchvision.transforms import functional as F
+from torch.utils.data import Dataset
+from torchvision import models
 from pathlib import Path
 from PIL import Image
+from tensor_cache import open_or_build
+from augment import BatchAugment
+from checkpointing import CheckpointManager
+import checkpointing
+import dataset_stats
+import trainer
 import numpy as np
-import random
 import os
 
 # ------------------ Config ------------------
@@ -22,10 +26,17 @@ EPOCHS = 12
 LR = 1e-3
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 SAVE_PATH = "seam_path_model.pth"
+TENSOR_CACHE_DIR = os.getenv("TENSOR_CACHE_DIR")  # set to decode+resize once into mmap shards
+STATS_CACHE = ROOT_DIR / "train" / "dataset_stats.json"
+
+parser = trainer.build_parser("Train the DeepLabV3 seam-path model")
+checkpointing.add_arguments(parser, "checkpoints/seam_path")
+args = parser.parse_args()
+engine = trainer.Engine(args, DEVICE)
 
 # ------------------ Dataset ------------------
 class SeamDataset(Dataset):
-    def __init__(self, images_dir, masks_dir, transform=None):
+    def __init__(self, images_dir, masks_dir, transform=None, cache_dir=None):
         self.images_dir = Path(images_dir)
         self.masks_dir = Path(masks_dir)
         self.transform = transform
@@ -38,112 +49,113 @@ class SeamDataset(Dataset):
         self.images = [img for img in sorted(self.images_dir.iterdir())
                        if img.suffix.lower() in {".jpg",".jpeg",".png"} and img.stem in self.masks_map]
 
+        # Optional pre-resized uint8 copies in memory-mapped shards (see tensor_cache.py)
+        self.cache = None
+        if cache_dir:
+            pairs = [(img, self.masks_map[img.stem]) for img in self.images]
+            self.cache = open_or_build(pairs, cache_dir, IMG_SIZE)
+
     def __len__(self):
         return len(self.images)
 
     def __getitem__(self, idx):
-        img_path = self.images[idx]
-        mask_path = self.masks_map[img_path.stem]
+        # Returns uint8 image [3,H,W] and long mask [H,W]; augmentation and
+        # normalization run per batch (see BatchAugment below)
+        if self.cache is not None:
+            image, mask = self.cache[idx]
+        else:
+            img_path = self.images[idx]
+            mask_path = self.masks_map[img_path.stem]
 
-        image = Image.open(img_path).convert("RGB")
-        mask = Image.open(mask_path).convert("L")
+            image = Image.open(img_path).convert("RGB")
+            mask = Image.open(mask_path).convert("L")
 
-        # Resize
-        image = image.resize(IMG_SIZE, Image.BILINEAR)
-        mask = mask.resize(IMG_SIZE, Image.NEAREST)
+            # Resize
+            image = image.resize(IMG_SIZE, Image.BILINEAR)
+            mask = mask.resize(IMG_SIZE, Image.NEAREST)
+
+        image = torch.from_numpy(np.array(image)).permute(2, 0, 1)
 
         # Convert mask to binary 0/1
         mask = np.array(mask)
         mask = (mask > 128).astype(np.uint8)
         mask = torch.from_numpy(mask).long()
 
-        # Data augmentation
         if self.transform:
-            image = self.transform(image)
-
-        # Random horizontal flip
-        if random.random() > 0.5:
-            image = F.hflip(image)
-            mask = torch.flip(mask, [1])
-
-        # Random rotation
-        angle = random.uniform(-10, 10)
-        image = F.rotate(image, angle)
-        mask = F.rotate(mask.unsqueeze(0).float(), angle).squeeze(0).long()
+            image, mask = self.transform(image, mask)
 
         return image, mask
 
-# ------------------ Transforms ------------------
-train_transform = transforms.Compose([
-    transforms.ToTensor(),
-    transforms.Normalize([0.485,0.456,0.406],[0.229,0.224,0.225])
-])
+# ------------------ Augmentation ------------------
+# Applied to whole batches after collation: random horizontal flip and
+# +/-10 degree rotation (image and mask together), then ImageNet normalization
+train_augment = BatchAugment(hflip=0.5, degrees=10)
+val_augment = BatchAugment()
 
 # ------------------ Datasets & Dataloaders ------------------
-train_dataset = SeamDataset(TRAIN_IMG_DIR, TRAIN_MASK_DIR, transform=train_transform)
-val_dataset   = SeamDataset(VAL_IMG_DIR, VAL_MASK_DIR, transform=train_transform)
+def cache_dir(name):
+    return os.path.join(TENSOR_CACHE_DIR, name) if TENSOR_CACHE_DIR else None
+
+with engine.main_first():  # rank 0 builds the tensor caches, the others reuse them
+    train_dataset = SeamDataset(TRAIN_IMG_DIR, TRAIN_MASK_DIR, cache_dir=cache_dir("seam_path_train"))
+    val_dataset   = SeamDataset(VAL_IMG_DIR, VAL_MASK_DIR, cache_dir=cache_dir("seam_path_val"))
 
-train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-val_loader   = DataLoader(val_dataset, batch_size=BATCH_SIZE, shuffle=False)
+train_loader = engine.loader(train_dataset, BATCH_SIZE, shuffle=True)
+val_loader   = engine.loader(val_dataset, BATCH_SIZE)
 
 # ------------------ Model ------------------
 model = models.segmentation.deeplabv3_resnet50(weights=None, aux_loss=False)
 model.classifier[4] = nn.Conv2d(256, 2, kernel_size=1)  # 2 classes: background & seam
-model = model.to(DEVICE)
+model = engine.prepare(model)
 
 # ------------------ Weighted Loss ------------------
-# Count seam pixels for weighting
-num_seam_pixels = sum([torch.sum(mask) for _, mask in train_dataset])
-num_total_pixels = len(train_dataset) * IMG_SIZE[0] * IMG_SIZE[1]
-weight_bg = 1.0
-weight_seam = num_total_pixels / (num_seam_pixels + 1e-6)
-class_weights = torch.tensor([weight_bg, weight_seam]).to(DEVICE)
+# Count seam pixels on the raw (un-augmented) masks; cached per file hash
+train_pairs = [(img, train_dataset.masks_map[img.stem]) for img in train_dataset.images]
+train_stats = None
+if engine.is_main:
+    train_stats = dataset_stats.compute_stats(train_pairs, IMG_SIZE, cache_path=STATS_CACHE)
+    print(f"Seam pixel frequency: {train_stats['class_frequency'][1]:.4%}, "
+          f"mask coverage: {train_stats['mask_coverage']:.1%}")
+train_stats = engine.broadcast_object(train_stats)
+weight_bg, weight_seam = dataset_stats.class_weights(train_stats)
+class_weights = torch.tensor([weight_bg, weight_seam]).to(engine.device)
 criterion = nn.CrossEntropyLoss(weight=class_weights)
 
 # ------------------ Optimizer & Scheduler ------------------
 optimizer = torch.optim.Adam(model.parameters(), lr=LR)
 scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=5, gamma=0.5)
 
-# ------------------ Dice Metric ------------------
-def dice_coeff(pred, target, smooth=1e-6):
-    pred = torch.argmax(pred, dim=1)
-    intersection = (pred * target).sum()
-    union = pred.sum() + target.sum()
-    dice = (2 * intersection + smooth) / (union + smooth)
-    return dice
+# ------------------ Checkpointing ------------------
+ckpt = CheckpointManager(args.checkpoint_dir, keep_best=args.keep_best, every=args.checkpoint_every,
+                         enabled=engine.is_main, resume=bool(args.resume))
+start_epoch = 0
+if args.resume:
+    start_epoch, _ = ckpt.resume(model, optimizer, scheduler, path=args.resume)
+    engine.epoch = start_epoch
 
 # ------------------ Training Loop ------------------
-for epoch in range(EPOCHS):
-    model.train()
-    train_loss = 0.0
-    for images, masks in train_loader:
-        images, masks = images.to(DEVICE), masks.to(DEVICE)
-        optimizer.zero_grad()
-        outputs = model(images)['out']
-        loss = criterion(outputs, masks)
-        loss.backward()
-        optimizer.step()
-        train_loss += loss.item() * images.size(0)
-    train_loss /= len(train_loader.dataset)
+for epoch in range(start_epoch, EPOCHS):
+    train_loss = engine.train_epoch(model, train_loader, criterion, optimizer, output_key="out",
+                                    batch_transform=train_augment)
 
     # Validation
-    model.eval()
-    val_loss = 0.0
-    val_dice = 0.0
-    with torch.no_grad():
-        for images, masks in val_loader:
-            images, masks = images.to(DEVICE), masks.to(DEVICE)
-            outputs = model(images)['out']
-            val_loss += criterion(outputs, masks).item() * images.size(0)
-            val_dice += dice_coeff(outputs, masks).item() * images.size(0)
-    val_loss /= len(val_loader.dataset)
-    val_dice /= len(val_loader.dataset)
-
-    print(f"Epoch [{epoch+1}/{EPOCHS}] "
-          f"Train Loss: {train_loss:.4f} | Val Loss: {val_loss:.4f} | Val Dice: {val_dice:.4f}")
+    dice = trainer.DiceMeter()
+    val_loss = engine.evaluate(model, val_loader, criterion, output_key="out", on_batch=dice,
+                               batch_transform=val_augment)
+    val_dice = dice.compute(engine)
+
+    if engine.is_main:
+        print(f"Epoch [{epoch+1}/{EPOCHS}] "
+              f"Train Loss: {train_loss:.4f} | Val Loss: {val_loss:.4f} | Val Dice: {val_dice:.4f}")
 
     scheduler.step()
+    ckpt.save(epoch + 1, model, optimizer, scheduler, metric=val_dice, force=epoch + 1 == EPOCHS)
 
 # ------------------ Save Model ------------------
-torch.save(model.state_dict(), SAVE_PATH)
-print(f"Training complete. Model saved to {SAVE_PATH}")
+ckpt.close()
+engine.save(model, SAVE_PATH)
+if engine.is_main:
+    print(f"Training complete. Model saved to {SAVE_PATH}")
+    if ckpt.best_path:
+        print(f"Best Val Dice {ckpt.best_metric:.4f}: {ckpt.best_path}")
+engine.close()
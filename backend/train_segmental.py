@@ -1,16 +1,23 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import Dataset
 from torchvision import transforms as T
 from torchvision.models.segmentation import deeplabv3_resnet50, DeepLabV3_ResNet50_Weights
 from PIL import Image
+import numpy as np
 import os
 import glob
 
+from tensor_cache import open_or_build
+import trainer
+import checkpointing
+from checkpointing import CheckpointManager
+
 # --- Custom Dataset ---
 class WeldDataset(Dataset):
-    def __init__(self, image_dir, mask_dir, mask_suffix="_combined.png", transform=None):
+    def __init__(self, image_dir, mask_dir, mask_suffix="_combined.png", transform=None,
+                 cache_dir=None, cache_size=(256, 256)):
         self.image_paths = []
         self.mask_paths = []
 
@@ -44,15 +51,26 @@ class WeldDataset(Dataset):
         num_bad = len([p for p in self.image_paths if "bad" in p])
         print(f"[INFO] Loaded {len(self.image_paths)} samples ({num_good} good, {num_bad} bad)")
 
+        # Optional pre-resized uint8 copies in memory-mapped shards (see tensor_cache.py);
+        # masks are resized bilinearly like T.Resize does
+        self.cache = None
+        if cache_dir:
+            self.cache = open_or_build(list(zip(self.image_paths, self.mask_paths)), cache_dir,
+                                       cache_size, mask_resample=Image.BILINEAR)
+
     def __len__(self):
         return len(self.image_paths)
 
     def __getitem__(self, idx):
-        img_path = self.image_paths[idx]
-        mask_path = self.mask_paths[idx]
+        if self.cache is not None:
+            image_arr, mask_arr = self.cache[idx]
+            image, mask = Image.fromarray(np.asarray(image_arr)), Image.fromarray(np.asarray(mask_arr))
+        else:
+            img_path = self.image_paths[idx]
+            mask_path = self.mask_paths[idx]
 
-        image = Image.open(img_path).convert("RGB")
-        mask = Image.open(mask_path).convert("L")
+            image = Image.open(img_path).convert("RGB")
+            mask = Image.open(mask_path).convert("L")
 
         if self.transform:
             image = self.transform(image)
@@ -69,6 +87,12 @@ DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 BATCH_SIZE = 4
 EPOCHS = 10
 LR = 1e-4
+TENSOR_CACHE_DIR = os.getenv("TENSOR_CACHE_DIR")  # set to decode+resize once into mmap shards
+
+parser = trainer.build_parser("Train DeepLabV3 weld defect segmentation")
+checkpointing.add_arguments(parser, "checkpoints/segmental")
+args = parser.parse_args()
+engine = trainer.Engine(args, DEVICE)
 
 # --- Transforms ---
 transform = T.Compose([
@@ -77,52 +101,54 @@ transform = T.Compose([
 ])
 
 # --- Load Datasets ---
-train_dataset = WeldDataset("dataset/train/images", "dataset/train/masks", transform=transform)
-val_dataset = WeldDataset("dataset/val/images", "dataset/val/masks", transform=transform)
+with engine.main_first():  # rank 0 builds the tensor caches, the others reuse them
+    train_dataset = WeldDataset("dataset/train/images", "dataset/train/masks", transform=transform,
+                                cache_dir=TENSOR_CACHE_DIR and os.path.join(TENSOR_CACHE_DIR, "segmental_train"))
+    val_dataset = WeldDataset("dataset/val/images", "dataset/val/masks", transform=transform,
+                              cache_dir=TENSOR_CACHE_DIR and os.path.join(TENSOR_CACHE_DIR, "segmental_val"))
 
-train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE, shuffle=False)
+train_loader = engine.loader(train_dataset, BATCH_SIZE, shuffle=True)
+val_loader = engine.loader(val_dataset, BATCH_SIZE)
 
 # --- Model ---
 model = deeplabv3_resnet50(weights=DeepLabV3_ResNet50_Weights.DEFAULT)
 model.classifier[-1] = nn.Conv2d(256, 2, kernel_size=1)  # 2 classes (good vs defect)
-model.to(DEVICE)
+model = engine.prepare(model, find_unused_parameters=True)  # aux head isn't in the loss
 
 # --- Loss & Optimizer ---
 criterion = nn.CrossEntropyLoss()
 optimizer = optim.Adam(model.parameters(), lr=LR)
 
-# --- Training Loop ---
-for epoch in range(EPOCHS):
-    model.train()
-    train_loss = 0
-
-    for images, masks in train_loader:
-        images, masks = images.to(DEVICE), masks.to(DEVICE)
+# --- Checkpointing ---
+ckpt = CheckpointManager(args.checkpoint_dir, keep_best=args.keep_best, every=args.checkpoint_every,
+                         enabled=engine.is_main, resume=bool(args.resume))
+start_epoch = 0
+if args.resume:
+    start_epoch, _ = ckpt.resume(model, optimizer, path=args.resume)
+    engine.epoch = start_epoch
 
-        outputs = model(images)["out"]  # shape [B,2,H,W]
-        loss = criterion(outputs, masks)
+# --- Training Loop ---
+for epoch in range(start_epoch, EPOCHS):
+    train_loss = engine.train_epoch(model, train_loader, criterion, optimizer, output_key="out")
 
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
+    # Validation
+    dice = trainer.DiceMeter()
+    val_loss = engine.evaluate(model, val_loader, criterion, output_key="out", on_batch=dice)
+    val_dice = dice.compute(engine)
 
-        train_loss += loss.item()
+    if engine.is_main:
+        print(f"Epoch {epoch+1}/{EPOCHS}, "
+              f"Train Loss: {train_loss:.4f}, "
+              f"Val Loss: {val_loss:.4f}, "
+              f"Val Dice: {val_dice:.4f}")
 
-    # Validation
-    model.eval()
-    val_loss = 0
-    with torch.no_grad():
-        for images, masks in val_loader:
-            images, masks = images.to(DEVICE), masks.to(DEVICE)
-            outputs = model(images)["out"]
-            loss = criterion(outputs, masks)
-            val_loss += loss.item()
-
-    print(f"Epoch {epoch+1}/{EPOCHS}, "
-          f"Train Loss: {train_loss/len(train_loader):.4f}, "
-          f"Val Loss: {val_loss/len(val_loader):.4f}")
+    ckpt.save(epoch + 1, model, optimizer, metric=val_dice, force=epoch + 1 == EPOCHS)
 
 # --- Save Trained Model ---
-torch.save(model.state_dict(), "segmentation_model.pth")
-print("✅ Model saved as segmentation_model.pth")
+ckpt.close()
+engine.save(model, "segmentation_model.pth")
+if engine.is_main:
+    print("✅ Model saved as segmentation_model.pth")
+    if ckpt.best_path:
+        print(f"Best Val Dice {ckpt.best_metric:.4f}: {ckpt.best_path}")
+engine.close()
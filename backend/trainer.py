@@ -0,0 +1,278 @@
+import argparse
+import os
+from contextlib import contextmanager, nullcontext
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler
+
+
+# ----------------------------
+# Command-line options shared by the training scripts
+# ----------------------------
+def build_parser(description=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="DataLoader worker processes per training process "
+                             "(0 = load in the main process; default min(8, threads per process))")
+    parser.add_argument("--prefetch", type=int, default=4,
+                        help="batches prefetched per worker")
+    parser.add_argument("--amp", action="store_true",
+                        help="bfloat16 autocast (CPU and recent GPUs; float16 + loss scaling on older GPUs)")
+    parser.add_argument("--channels-last", action="store_true",
+                        help="NHWC memory format for conv-heavy models")
+    parser.add_argument("--compile", action="store_true",
+                        help="torch.compile the model (slow first epoch)")
+    parser.add_argument("--accum-steps", type=int, default=1,
+                        help="gradient accumulation steps per optimizer step")
+    parser.add_argument("--dist-backend", default=None,
+                        help="torch.distributed backend under torchrun (default gloo on CPU, nccl on CUDA)")
+    return parser
+
+
+# ----------------------------
+# Distributed (torchrun)
+# ----------------------------
+def init_distributed(device, backend=None):
+    """
+    Join the process group described by torchrun's environment (RANK,
+    WORLD_SIZE, MASTER_ADDR, ...). Returns (rank, world_size, device);
+    a plain `python script.py` run gets (0, 1, device) untouched.
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size <= 1:
+        return 0, 1, device
+
+    local_rank = int(os.environ.get("LOCAL_RANK", 0))
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    if device.type == "cuda":
+        device = torch.device("cuda", local_rank)
+        torch.cuda.set_device(device)
+    else:
+        # Split the node's cores between its processes instead of each one using all of them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+
+    if not dist.is_initialized():
+        dist.init_process_group(backend or ("nccl" if device.type == "cuda" else "gloo"))
+    return dist.get_rank(), world_size, device
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def dice_coeff(pred, target, smooth=1e-6):
+    """Foreground Dice of argmax(pred, dim=1) against a {0,1} mask, pooled over the batch."""
+    pred = torch.argmax(pred, dim=1)
+    intersection = (pred * target).sum()
+    union = pred.sum() + target.sum()
+    dice = (2 * intersection + smooth) / (union + smooth)
+    return dice
+
+
+class DiceMeter:
+    """on_batch callback averaging batch Dice over samples; compute() reduces across ranks."""
+
+    def __init__(self):
+        self.total, self.count = 0.0, 0
+
+    def __call__(self, outputs, masks):
+        self.total += dice_coeff(outputs, masks).item() * outputs.size(0)
+        self.count += outputs.size(0)
+
+    def compute(self, engine):
+        total, count = engine.reduce_sum(self.total, self.count)
+        return total / max(count, 1)
+
+
+# ----------------------------
+# Engine
+# ----------------------------
+class Engine:
+    """
+    Runs the epoch loops the training scripts used to hand-roll, adding
+    multi-worker loading, autocast, channels_last, torch.compile and
+    gradient accumulation as configured by build_parser() options.
+
+    Under torchrun each process trains a DistributedDataParallel replica on
+    its own shard of the data; batch_size is per process and reported
+    losses/metrics are reduced across all ranks.
+    """
+
+    def __init__(self, opts, device):
+        self.opts = opts
+        self.rank, self.world_size, self.device = init_distributed(device, opts.dist_backend)
+        self.is_main = self.rank == 0
+        self.epoch = 0
+        self.workers = opts.workers if opts.workers is not None else min(8, torch.get_num_threads())
+        self.amp_dtype = None
+        if opts.amp:
+            if self.device.type == "cuda" and not torch.cuda.is_bf16_supported():
+                self.amp_dtype = torch.float16
+            else:
+                self.amp_dtype = torch.bfloat16
+        self.scaler = torch.amp.GradScaler(self.device.type, enabled=self.amp_dtype == torch.float16)
+        self.memory_format = torch.channels_last if opts.channels_last else torch.contiguous_format
+
+    def loader(self, dataset, batch_size, shuffle=False, sampler=None, drop_last=False):
+        workers = self.workers
+        if sampler is None and self.world_size > 1:
+            if shuffle:
+                sampler = DistributedSampler(dataset, num_replicas=self.world_size, rank=self.rank,
+                                             shuffle=True, drop_last=drop_last)
+            else:
+                # Strided shard without DistributedSampler's padding, so each sample is scored once
+                sampler = range(self.rank, len(dataset), self.world_size)
+        return DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=shuffle if sampler is None else False,
+            sampler=sampler,
+            drop_last=drop_last,
+            num_workers=workers,
+            pin_memory=self.device.type == "cuda",
+            persistent_workers=workers > 0,
+            prefetch_factor=self.opts.prefetch if workers > 0 else None,
+        )
+
+    def prepare(self, model, find_unused_parameters=False):
+        """
+        Move (and optionally compile) the model; wrap it in DDP when
+        distributed. Pass find_unused_parameters=True for models with heads
+        that don't contribute to the loss (e.g. DeepLab's aux classifier).
+        """
+        model = model.to(self.device, memory_format=self.memory_format)
+        if self.opts.compile:
+            # In-place compile keeps state_dict() keys unchanged for saving
+            model.compile()
+        if self.world_size > 1:
+            device_ids = [self.device.index] if self.device.type == "cuda" else None
+            model = DistributedDataParallel(model, device_ids=device_ids,
+                                            find_unused_parameters=find_unused_parameters)
+        return model
+
+    @staticmethod
+    def unwrap(model):
+        return model.module if isinstance(model, DistributedDataParallel) else model
+
+    def save(self, model, path):
+        """Save the unwrapped state_dict from rank 0 only."""
+        if self.is_main:
+            torch.save(self.unwrap(model).state_dict(), path)
+
+    def barrier(self):
+        if self.world_size > 1:
+            dist.barrier()
+
+    @contextmanager
+    def main_first(self):
+        """Run the block on rank 0 first (e.g. building caches), then on the other ranks."""
+        if not self.is_main:
+            self.barrier()
+        yield
+        if self.is_main:
+            self.barrier()
+
+    def reduce_sum(self, *values):
+        """Sum plain numbers across ranks; returns a tuple in the same order."""
+        if self.world_size == 1:
+            return values
+        t = torch.tensor(values, dtype=torch.float64, device=self.device)
+        dist.all_reduce(t)
+        return tuple(t.tolist())
+
+    def broadcast_object(self, obj):
+        """Rank 0's obj on every rank (picklable objects only)."""
+        if self.world_size == 1:
+            return obj
+        holder = [obj]
+        dist.broadcast_object_list(holder, src=0)
+        return holder[0]
+
+    def close(self):
+        if dist.is_initialized():
+            dist.destroy_process_group()
+
+    def autocast(self):
+        if self.amp_dtype is None:
+            return nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.amp_dtype)
+
+    def _to_device(self, inputs, targets, batch_transform=None):
+        non_blocking = self.device.type == "cuda"
+        inputs = inputs.to(self.device, non_blocking=non_blocking)
+        targets = targets.to(self.device, non_blocking=non_blocking)
+        if batch_transform is not None:
+            inputs, targets = batch_transform(inputs, targets)
+        if inputs.dim() == 4:
+            inputs = inputs.contiguous(memory_format=self.memory_format)
+        return inputs, targets
+
+    def _progress(self, loader, desc):
+        if desc is None or not self.is_main:
+            return loader
+        from tqdm import tqdm
+        return tqdm(loader, desc=desc)
+
+    def train_epoch(self, model, loader, criterion, optimizer, output_key=None,
+                    on_batch=None, desc=None, batch_transform=None):
+        """
+        One pass over loader; returns the mean loss per sample.
+        batch_transform(inputs, targets) -> (inputs, targets) runs on each
+        collated batch once it is on the device (see augment.BatchAugment).
+        """
+        model.train()
+        if isinstance(loader.sampler, DistributedSampler):
+            loader.sampler.set_epoch(self.epoch)
+        self.epoch += 1
+        accum = max(1, self.opts.accum_steps)
+        total_loss, seen = 0.0, 0
+        optimizer.zero_grad(set_to_none=True)
+
+        for step, (inputs, targets) in enumerate(self._progress(loader, desc)):
+            inputs, targets = self._to_device(inputs, targets, batch_transform)
+            boundary = (step + 1) % accum == 0 or step + 1 == len(loader)
+            # Skip the DDP gradient all-reduce on accumulation-only steps
+            sync = model.no_sync() if self.world_size > 1 and not boundary else nullcontext()
+            with sync:
+                with self.autocast():
+                    outputs = model(inputs)
+                    if output_key is not None:
+                        outputs = outputs[output_key]
+                    loss = criterion(outputs, targets)
+                self.scaler.scale(loss / accum).backward()
+
+            if boundary:
+                self.scaler.step(optimizer)
+                self.scaler.update()
+                optimizer.zero_grad(set_to_none=True)
+
+            total_loss += loss.item() * inputs.size(0)
+            seen += inputs.size(0)
+            if on_batch is not None:
+                on_batch(outputs.detach().float(), targets)
+
+        total_loss, seen = self.reduce_sum(total_loss, seen)
+        return total_loss / max(seen, 1)
+
+    @torch.no_grad()
+    def evaluate(self, model, loader, criterion=None, output_key=None, on_batch=None, desc=None,
+                 batch_transform=None):
+        """Inference pass; returns the mean loss per sample (None without criterion)."""
+        model.eval()
+        total_loss, seen = 0.0, 0
+        for inputs, targets in self._progress(loader, desc):
+            inputs, targets = self._to_device(inputs, targets, batch_transform)
+            with self.autocast():
+                outputs = model(inputs)
+                if output_key is not None:
+                    outputs = outputs[output_key]
+                if criterion is not None:
+                    total_loss += criterion(outputs, targets).item() * inputs.size(0)
+            seen += inputs.size(0)
+            if on_batch is not None:
+                on_batch(outputs.float(), targets)
+        if criterion is None:
+            return None
+        total_loss, seen = self.reduce_sum(total_loss, seen)
+        return total_loss / max(seen, 1)
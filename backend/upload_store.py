@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+UPLOAD_STORE_DB = os.getenv("UPLOAD_STORE_DB", "uploads.db")
+MEMORY_BYTES = int(os.getenv("UPLOAD_MEMORY_BYTES", str(8 * 1024 * 1024)))  # larger bodies spill to a temp file
+CHUNK_SIZE = 1 << 20
+
+
+class UploadStore:
+    """
+    Content-addressed upload storage: every distinct file is kept once under
+    <root>/objects/ab/cd/<sha256><ext>, and a SQLite table maps each uploaded
+    filename to the hashes sent under it. put() hashes while reading the
+    stream; bodies up to memory_bytes are held in memory, so a duplicate of
+    an existing object is recognised without writing anything to disk.
+    """
+
+    def __init__(self, root="uploads", db_path=UPLOAD_STORE_DB, memory_bytes=MEMORY_BYTES):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, ".tmp")
+        self.memory_bytes = memory_bytes
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        for name in os.listdir(self.tmp_dir):  # leftovers from an interrupted upload
+            os.remove(os.path.join(self.tmp_dir, name))
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_objects (
+                sha256 TEXT PRIMARY KEY,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_names (
+                filename TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                uploaded_at REAL NOT NULL,
+                PRIMARY KEY (filename, sha256)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS upload_names_sha256 ON upload_names (sha256)")
+        self._conn.commit()
+
+    def path_for(self, sha256, ext=""):
+        return os.path.join(self.objects_dir, sha256[:2], sha256[2:4], sha256 + ext)
+
+    def _spool(self, fileobj):
+        """Read fileobj once, hashing as it goes -> (sha256, size, bytes or None, temp path or None)."""
+        h = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        tmp_path, out = None, None
+        try:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+                size += len(chunk)
+                if out is None and size > self.memory_bytes:
+                    tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+                    out = open(tmp_path, "wb")
+                    out.write(buffer)
+                    buffer = None
+                if out is not None:
+                    out.write(chunk)
+                else:
+                    buffer += chunk
+        except BaseException:
+            if out is not None:
+                out.close()
+                os.remove(tmp_path)
+            raise
+        if out is not None:
+            out.close()
+        return h.hexdigest(), size, buffer, tmp_path
+
+    def put(self, fileobj, filename):
+        """
+        Store the contents of fileobj uploaded as filename.
+        -> {"sha256", "path", "size", "duplicate"}; duplicate means the
+        object already existed and nothing new was written.
+        """
+        sha256, size, buffer, tmp_path = self._spool(fileobj)
+        ext = os.path.splitext(filename)[1].lower()
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT ext FROM upload_objects WHERE sha256 = ?", (sha256,)).fetchone()
+            duplicate = row is not None and os.path.exists(self.path_for(sha256, row[0]))
+            if duplicate:
+                ext = row[0]
+                if tmp_path is not None:
+                    os.remove(tmp_path)
+            else:
+                path = self.path_for(sha256, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if tmp_path is None:
+                    tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+                    with open(tmp_path, "wb") as out:
+                        out.write(buffer)
+                os.replace(tmp_path, path)
+            with self._conn:
+                if not duplicate:
+                    self._conn.execute("INSERT OR REPLACE INTO upload_objects (sha256, ext, size, created_at) "
+                                       "VALUES (?, ?, ?, ?)", (sha256, ext, size, now))
+                self._conn.execute("INSERT OR REPLACE INTO upload_names (filename, sha256, uploaded_at) "
+                                   "VALUES (?, ?, ?)", (filename, sha256, now))
+        return {"sha256": sha256, "path": self.path_for(sha256, ext), "size": size, "duplicate": duplicate}
+
+    def lookup(self, filename):
+        """Object path most recently uploaded as filename, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT o.sha256, o.ext FROM upload_names n JOIN upload_objects o ON o.sha256 = n.sha256 "
+                "WHERE n.filename = ? ORDER BY n.uploaded_at DESC LIMIT 1", (filename,)
+            ).fetchone()
+        return self.path_for(*row) if row is not None else None
+
+    def names(self, sha256):
+        """Every filename the object with this hash was uploaded as."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename FROM upload_names WHERE sha256 = ? ORDER BY uploaded_at", (sha256,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self):
+        self._conn.close()